@@ -0,0 +1,136 @@
+"""
+Research many startups in one process.
+
+Startup names are read from a file (or stdin), one per line. Models, the HTTP fetch engine,
+the extraction process pool, the browser pool and the on-disk caches are created once and
+shared by every company, and companies are researched in parallel. Each company gets its own
+markdown report, and a summary of throughput and failures is written next to them. The download
+budget (--run_max_mb) applies to each company, and the summary reports what each downloaded and
+the pages it skipped once its budget was exhausted.
+
+Usage:
+    python batch_researcher.py startups.txt -d reports -p 4
+    cat startups.txt | python batch_researcher.py -
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+from rich.progress import Progress
+
+import fetch_engine as fe
+import startup_researcher as sr
+
+
+def read_startup_names(lines) -> list:
+    """
+    Startup names of the input lines, in order, skipping blank lines, # comments and repeats.
+    """
+    names = []
+    seen = set()
+    for line in lines:
+        name = line.strip()
+        if name and not name.startswith('#') and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def write_summary(file_path: str, outcomes: list, elapsed: float):
+    """
+    Write the throughput, failures and downloads of a batch to a markdown file.
+    """
+    succeeded = [outcome for outcome in outcomes if outcome['error'] is None]
+    failed = [outcome for outcome in outcomes if outcome['error'] is not None]
+    partial = [outcome for outcome in succeeded if outcome['ingestion_errors']]
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write("# Batch Research Summary\n\n")
+        f.write(f"- Startups: {len(outcomes)} ({len(succeeded)} succeeded, {len(failed)} failed)\n")
+        f.write(f"- Partial indexes: {len(partial)} (answered despite ingestion errors)\n")
+        f.write(f"- Wall-clock time: {elapsed:.1f}s\n")
+        if outcomes:
+            f.write(f"- Throughput: {len(outcomes) / elapsed * 60:.2f} startups per minute\n")
+            f.write(f"- Mean time per startup: {sum(o['seconds'] for o in outcomes) / len(outcomes):.1f}s\n")
+        f.write(f"- Downloaded: {fe.get_engine().bytes_downloaded / (1024 * 1024):.1f} MB\n\n")
+        f.write("| Startup | Status | Ingestion errors | Downloaded MB | Over-budget skips | Seconds | Report |\n")
+        f.write("| --- | --- | --- | --- | --- | --- | --- |\n")
+        for outcome in outcomes:
+            if outcome['error'] is not None:
+                status = f"failed: {outcome['error']}"
+            else:
+                status = "partial index" if outcome['ingestion_errors'] else "ok"
+            ingestion_errors = '' if outcome['ingestion_errors'] is None else outcome['ingestion_errors']
+            f.write(f"| {outcome['startup']} | {status} | {ingestion_errors} | "
+                    f"{outcome['bytes_downloaded'] / (1024 * 1024):.1f} | {outcome['skipped_downloads']} | "
+                    f"{outcome['seconds']:.1f} | {outcome['report'] or ''} |\n")
+
+
+@click.command()
+@click.argument('input_file', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('-d', '--output_dir', default='reports', show_default=True, help='Directory of the reports and of the summary.')
+@click.option('-p', '--parallel', default=2, show_default=True, help='Number of startups researched at once.')
+@sr.runtime_options
+def main(input_file, output_dir, parallel, **settings):
+    """
+    Research every startup listed in INPUT_FILE (one name per line, - for stdin).
+    """
+    names = read_startup_names(input_file)
+    if not names:
+        sr.console.log("No startup names to research")
+        return
+    os.makedirs(output_dir, exist_ok=True)
+
+    runtime = sr.create_runtime(**settings)
+    started = time.perf_counter()
+
+    def research(startup_name):
+        company_started = time.perf_counter()
+        report_started = time.time()
+        report = os.path.join(output_dir, f"{sr.get_index_name(startup_name)}.md")
+        # Each company downloads under its own budget, whatever the others downloaded
+        budget = runtime.download_budget()
+        try:
+            # Live statuses and echoed answers are disabled: only the batch progress bar is displayed
+            _, ingestion_errors = sr.research_startup(startup_name, runtime, show_status=False,
+                                                      report_file=report, echo=False, budget=budget)
+            error = None
+        except Exception as e:
+            # A report interrupted while answering is kept, partial
+            error = str(e)
+            ingestion_errors = None
+            if not os.path.exists(report) or os.path.getmtime(report) < report_started:
+                report = None
+        return {'startup': startup_name, 'report': report, 'error': error, 'ingestion_errors': ingestion_errors,
+                'bytes_downloaded': budget.bytes_downloaded, 'skipped_downloads': budget.skipped,
+                'seconds': time.perf_counter() - company_started}
+
+    outcomes = {}
+    try:
+        with Progress(console=sr.console) as progress, ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            task = progress.add_task("[bold green]Researching startups", total=len(names))
+            futures = {executor.submit(research, name): name for name in names}
+            for future in as_completed(futures):
+                outcome = future.result()
+                outcomes[outcome['startup']] = outcome
+                if outcome['error'] is not None:
+                    sr.console.log(f"Failed to research {outcome['startup']}: {outcome['error']}")
+                elif outcome['ingestion_errors']:
+                    sr.console.log(f"{outcome['startup']} was answered from a partial index: "
+                                   f"{outcome['ingestion_errors']} ingestion errors")
+                progress.advance(task)
+    finally:
+        runtime.close()
+
+    elapsed = time.perf_counter() - started
+    summary_file = os.path.join(output_dir, "summary.md")
+    ordered = [outcomes[name] for name in names if name in outcomes]
+    write_summary(summary_file, ordered, elapsed)
+    failed = sum(1 for outcome in ordered if outcome['error'] is not None)
+    sr.console.log(f"Researched {len(ordered) - failed}/{len(names)} startups in {elapsed:.1f}s, "
+                   f"summary written to {summary_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measure the import time of the project modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so nothing is
+shared between measurements. The total and the slowest imports (by cumulative time) are
+printed, and the script exits with status 1 when a module exceeds the startup-time budget.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py models startup_researcher --budget_ms 1500 --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["models", "rag", "vector_stores", "extraction", "web_crawler", "nlp_rag", "startup_researcher"]
+
+
+def measure(module: str):
+    """
+    Import a module in a fresh interpreter and return its import time and the (cumulative, name)
+    of every module it imported, in microseconds. Raise RuntimeError if the import fails.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        imports.append((int(cumulative), name[1:].rstrip()))
+    # Nested imports are listed (indented) before the module importing them, and the measured
+    # module is the last top-level one: its imports are those since the previous top-level line
+    end = max(i for i, (_, name) in enumerate(imports) if name == module)
+    start = max((i for i, (_, name) in enumerate(imports[:end]) if not name.startswith(" ")), default=-1) + 1
+    return imports[end][0], [(cumulative, name.strip()) for cumulative, name in imports[start:end]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument("--budget_ms", type=float, default=2000.0, help="Maximum import time of each module.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        try:
+            total, imports = measure(module)
+        except RuntimeError as e:
+            print(f"{module}: import failed ({e})")
+            over_budget.append(module)
+            continue
+        status = "ok" if total / 1000 <= args.budget_ms else "OVER BUDGET"
+        print(f"{module}: {total / 1000:.0f} ms ({status}, budget {args.budget_ms:.0f} ms)")
+        # Packages only, their submodules are counted in the package time
+        packages = sorted((i for i in imports if "." not in i[1]), reverse=True)
+        for cumulative, name in packages[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        if status != "ok":
+            over_budget.append(module)
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Check that a batched pipeline stage overlaps with the stages feeding it.
+
+A split-like stage produces items for a few seconds, and an embed-like stage consumes them in
+batches larger than a typical run (the shape of the ingestion pipeline of startup_researcher).
+Batches must be flushed after `--flush_seconds` instead of waiting for a full batch or for the
+end of the stream: the script exits with status 1 when the first batch only starts after the
+producer finished.
+
+Usage:
+    python benchmarks/pipeline_overlap.py
+    python benchmarks/pipeline_overlap.py --items 400 --item_ms 5 --batch_size 250 --flush_seconds 1
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=400, help="Items produced by the first stage.")
+    parser.add_argument("--item_ms", type=float, default=5.0, help="Milliseconds to produce one item.")
+    parser.add_argument("--batch_size", type=int, default=250, help="Batch size of the second stage.")
+    parser.add_argument("--workers", type=int, default=2, help="Workers of the batched stage.")
+    parser.add_argument("--flush_seconds", type=float, default=1.0, help="Flush delay of partial batches.")
+    args = parser.parse_args()
+
+    produced_at = []
+    batches = []
+    lock = threading.Lock()
+
+    def produce(item):
+        time.sleep(args.item_ms / 1000)
+        with lock:
+            produced_at.append(time.perf_counter())
+        return [item]
+
+    def consume(batch):
+        with lock:
+            batches.append((time.perf_counter(), len(batch)))
+        return [len(batch)]
+
+    started = time.perf_counter()
+    results = (pipeline.Pipeline()
+               .add_stage("produce", produce)
+               .add_stage("consume", consume, workers=args.workers, batch_size=args.batch_size,
+                          flush_seconds=args.flush_seconds)
+               .run(range(args.items)))
+    produced = max(produced_at) - started
+    first_batch = min(at for at, _ in batches) - started
+
+    print(f"producer finished after {produced:.2f}s")
+    print(f"first batch after {first_batch:.2f}s, {len(batches)} batches: {[size for _, size in sorted(batches)]}")
+    if sum(results) != args.items:
+        print(f"LOST ITEMS: {sum(results)} of {args.items} consumed")
+        sys.exit(1)
+    if first_batch >= produced:
+        print("NO OVERLAP: the batched stage only started after the producer finished")
+        sys.exit(1)
+    print("ok: batches start while items are still produced")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark the semantic splitter of nlp_rag against the previous implementation.
+
+The previous implementation re-processed every sentence with spaCy to get its vector and
+computed sklearn's `cosine_similarity` once per pair of consecutive sentences. It is kept here,
+as the reference the vectorized splitter must match: the script exits with status 1 when the
+chunks differ.
+
+Documents are generated from the markdown reports in `samples/`: runs of paragraphs, so that
+topics change at random, whose sentences are mutated (words swapped, out-of-vocabulary tokens
+and numbers inserted) so that sentences almost never repeat and the sentence-vector cache of the
+previous implementation can't hide its per-sentence cost. Both splitters run on the same parsed
+docs (parsing is timed separately).
+
+Usage:
+    python benchmarks/semantic_splitting.py
+    python benchmarks/semantic_splitting.py --documents 20 --sentences 2000 --max_chunk_size 10
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlp_rag as nr  # noqa: E402
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples")
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def load_paragraphs(samples_dir=SAMPLES_DIR):
+    """The non-empty lines (paragraphs, headings, list items) of the markdown samples."""
+    paragraphs = []
+    for name in sorted(os.listdir(samples_dir)):
+        if name.endswith(".md"):
+            with open(os.path.join(samples_dir, name), encoding="utf-8") as f:
+                paragraphs += [line.rstrip() for line in f if line.strip()]
+    return paragraphs
+
+
+def legacy_splitting(docs, max_chunk_size, similarity_threshold):
+    """The splitter before vectorization, on already parsed docs."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    all_doc_chunks = []
+    for doc in docs:
+        sentences = list(doc.sents)
+        if not sentences:
+            all_doc_chunks.append([])
+            continue
+
+        sentence_embeddings = np.array([nr.get_sentence_vector(sent.text) for sent in sentences])
+
+        chunks = []
+        current_chunk = [sentences[0].text]
+        current_chunk_size = 1
+        for i in range(1, len(sentences)):
+            similarity = cosine_similarity(
+                sentence_embeddings[i - 1].reshape(1, -1),
+                sentence_embeddings[i].reshape(1, -1)
+            )[0][0]
+            if similarity < similarity_threshold or current_chunk_size >= max_chunk_size:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = [sentences[i].text]
+                current_chunk_size = 1
+            else:
+                current_chunk.append(sentences[i].text)
+                current_chunk_size += 1
+        if current_chunk:
+            chunks.append(' '.join(current_chunk))
+        all_doc_chunks.append(chunks)
+    return all_doc_chunks
+
+
+def mutate(sentence, vocabulary, rng):
+    """
+    A variant of a sample sentence: some words replaced by other words of the samples, and
+    sometimes an out-of-vocabulary token or a number, so that (almost) no sentence repeats.
+    """
+    words = sentence.split(' ')
+    for i in range(len(words)):
+        if rng.random() < 0.2:
+            words[i] = rng.choice(vocabulary)
+    if rng.random() < 0.5:
+        words.insert(rng.randrange(len(words) + 1), ''.join(rng.choice(string.ascii_letters + string.digits)
+                                                             for _ in range(rng.randint(4, 10))))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words) + 1), f"{rng.randint(1, 10 ** 6):,}")
+    return ' '.join(words)
+
+
+def generate_documents(count, sentences, seed):
+    """
+    Documents made of runs of consecutive sample paragraphs, so that topics change at random, with
+    every sentence mutated. Paragraphs keep their markdown and are separated by varied newlines.
+    """
+    rng = random.Random(seed)
+    paragraphs = load_paragraphs()
+    vocabulary = sorted({word for paragraph in paragraphs for word in paragraph.split()})
+    documents = []
+    for _ in range(count):
+        parts = []
+        n_sentences = 0
+        while n_sentences < sentences:
+            start = rng.randrange(len(paragraphs))
+            for paragraph in paragraphs[start:start + rng.randint(1, 6)]:
+                paragraph_sentences = [mutate(sentence, vocabulary, rng) for sentence in _SENTENCE_RE.split(paragraph)]
+                n_sentences += len(paragraph_sentences)
+                parts.append(' '.join(paragraph_sentences))
+                parts.append(rng.choice(["\n", "\n\n", " \n", "\n\n\n"]))
+        documents.append(''.join(parts))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10, help="Number of documents.")
+    parser.add_argument("--sentences", type=int, default=1000, help="Sentences per document.")
+    parser.add_argument("--max_chunk_size", type=int, default=100, help="Maximum sentences per chunk.")
+    parser.add_argument("--similarity_threshold", type=float, default=0.5, help="Threshold of a new chunk.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated documents.")
+    args = parser.parse_args()
+
+    documents = generate_documents(args.documents, args.sentences, args.seed)
+
+    started = time.perf_counter()
+    docs = list(nr.get_nlp().pipe(documents))
+    parsing = time.perf_counter() - started
+    n_sentences = sum(len(list(doc.sents)) for doc in docs)
+    print(f"{len(docs)} documents, {n_sentences} sentences, parsed in {parsing:.2f}s")
+
+    # Sentence vectors of the legacy splitter are cached across calls: clear them before timing
+    nr.get_sentence_vector.cache_clear()
+    started = time.perf_counter()
+    expected = legacy_splitting(docs, args.max_chunk_size, args.similarity_threshold)
+    legacy = time.perf_counter() - started
+    cache_info = nr.get_sentence_vector.cache_info()
+
+    started = time.perf_counter()
+    chunks = [nr.split_doc(doc, args.max_chunk_size, args.similarity_threshold) for doc in docs]
+    vectorized = time.perf_counter() - started
+
+    print(f"legacy:     {legacy:.3f}s ({legacy / n_sentences * 1e6:.1f} us per sentence)")
+    print(f"vectorized: {vectorized:.3f}s ({vectorized / n_sentences * 1e6:.1f} us per sentence)")
+    print(f"speedup:    {legacy / vectorized:.1f}x")
+    print(f"legacy sentence-vector cache: {cache_info.hits} hits, {cache_info.misses} misses")
+
+    if chunks != expected:
+        mismatches = sum(1 for got, want in zip(chunks, expected) if got != want)
+        print(f"MISMATCH: the chunks of {mismatches} documents differ from the legacy splitter")
+        sys.exit(1)
+    print(f"identical chunks: {sum(len(doc_chunks) for doc_chunks in chunks)} chunks")
+
+
+if __name__ == "__main__":
+    main()
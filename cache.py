@@ -0,0 +1,605 @@
+"""
+Persistent on-disk caches shared across runs.
+
+Classes:
+- PageCache:
+    Content-addressed cache of fetched pages (raw body, headers and extracted text) with a TTL,
+    size-bounded LRU eviction and ETag/Last-Modified validators for conditional revalidation.
+- SearchCache:
+    Compressed SQLite cache of search API results keyed by (query, count, domain) with a TTL.
+- EmbeddingCache:
+    Embedding vectors keyed by (provider, model, hash of normalized text), indexed in SQLite and
+    stored in memory-mapped float32 arrays, with size-bounded LRU eviction.
+- CachedEmbeddings:
+    Embeddings wrapper that only sends cache misses to the provider, in batches.
+- LLMCache:
+    Chat model responses keyed by (provider, model, temperature, hash of messages), with a TTL
+    and size-bounded LRU eviction.
+
+Functions:
+- configure_page_cache(**settings) -> PageCache:
+    Replace the shared page cache with one built from the given settings.
+- get_page_cache() -> PageCache:
+    Return the shared page cache, creating it with default settings on first use.
+- configure_search_cache(**settings) -> SearchCache:
+    Replace the shared search cache with one built from the given settings.
+- get_search_cache() -> SearchCache:
+    Return the shared search cache, creating it with default settings on first use.
+- configure_llm_cache(**settings) -> LLMCache:
+    Enable the shared LLM response cache with the given settings.
+- get_llm_cache() -> Optional[LLMCache]:
+    Return the shared LLM response cache, or None when it is not enabled (the default).
+- embed_queries(embeddings: Embeddings, texts: List[str], max_concurrency: int = 8) -> List[List[float]]:
+    Embed several search queries with the batch query API of the provider where there is one.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+DEFAULT_CACHE_DIR = ".cache"
+# Providers whose embed_query is embed_documents of a single text
+SYMMETRIC_EMBEDDINGS = ('OpenAIEmbeddings', 'OllamaEmbeddings', 'MistralAIEmbeddings', 'TogetherEmbeddings',
+                        'FireworksEmbeddings')
+
+
+@dataclass
+class CachedPage:
+    url: str
+    kind: str
+    body_hash: str
+    headers: dict
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fresh: bool
+
+    def validators(self) -> Optional[dict]:
+        """Conditional request headers for revalidating this entry, if the server sent any."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers or None
+
+
+class PageCache:
+    """
+    Cache pages on disk. Bodies are stored once per SHA-256 under `<cache_dir>/pages/blobs`,
+    and an SQLite index maps each (kind, url) to its body, headers, extracted text and validators.
+
+    :param cache_dir: Root directory of the cache.
+    :param ttl: Seconds an entry is served without revalidation. 0 revalidates every entry.
+    :param max_bytes: Total body size kept on disk before least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = 7 * 24 * 3600, max_bytes: int = 1 << 30):
+        self.root = os.path.join(cache_dir, "pages")
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (kind, url)
+            )
+        """)
+        self._conn.commit()
+
+    def _blob_path(self, body_hash: str) -> str:
+        return os.path.join(self.blob_dir, body_hash[:2], body_hash)
+
+    def get(self, url: str, kind: str = "http") -> Optional[CachedPage]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body_hash, headers, text, etag, last_modified, fetched_at FROM pages WHERE kind = ? AND url = ?",
+                (kind, url)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE kind = ? AND url = ?", (now, kind, url))
+            self._conn.commit()
+        body_hash, headers, text, etag, last_modified, fetched_at = row
+        return CachedPage(url=url, kind=kind, body_hash=body_hash, headers=json.loads(headers), text=text,
+                          etag=etag, last_modified=last_modified, fetched_at=fetched_at,
+                          fresh=now - fetched_at < self.ttl)
+
+    def read_body(self, page: CachedPage) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(page.body_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url: str, body: bytes, headers: dict, text: str, kind: str = "http"):
+        """Store a page body and its extracted text, then evict old entries if over budget."""
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+
+        self._index(url, kind, hashlib.sha256(body).hexdigest(), len(body), headers, text, write)
+
+    def put_file(self, url: str, body_path: str, headers: dict, text: str, kind: str = "http"):
+        """Same as put, for a body already on disk (e.g. a streamed PDF). The file is copied."""
+        digest = hashlib.sha256()
+        with open(body_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self._index(url, kind, digest.hexdigest(), os.path.getsize(body_path), headers, text,
+                    lambda tmp_path: shutil.copyfile(body_path, tmp_path))
+
+    def _index(self, url: str, kind: str, body_hash: str, size: int, headers: dict, text: str, write):
+        """
+        Index a page, storing its body with `write(path)` if its blob is missing. The blob is
+        written to a temporary file outside the lock, but only published (or written again if
+        it was evicted meanwhile) under the lock that inserts its row, so an eviction running
+        in between can't leave the row without its blob.
+        """
+        path = self._blob_path(body_hash)
+        tmp_path = None
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            write(tmp_path)
+        headers = {key.lower(): value for key, value in dict(headers).items()}
+        now = time.time()
+        with self._lock:
+            if tmp_path is not None:
+                os.replace(tmp_path, path)
+            elif not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write(path)
+            previous = self._conn.execute("SELECT body_hash FROM pages WHERE kind = ? AND url = ?",
+                                          (kind, url)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, url, body_hash, size, json.dumps(headers), text,
+                 headers.get('etag'), headers.get('last-modified'), now, now))
+            if previous and previous[0] != body_hash:
+                self._drop_blob_if_unused(previous[0])
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, page: CachedPage, headers: Optional[dict] = None):
+        """Mark an entry as fresh again after a 304 Not Modified, keeping any updated validators."""
+        headers = {key.lower(): value for key, value in dict(headers or {}).items()}
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE kind = ? AND url = ?",
+                (time.time(), headers.get('etag'), headers.get('last-modified'), page.kind, page.url))
+            self._conn.commit()
+
+    def _drop_blob_if_unused(self, body_hash: str) -> bool:
+        if self._conn.execute("SELECT 1 FROM pages WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+            return False
+        try:
+            os.remove(self._blob_path(body_hash))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _evict(self):
+        # Blobs shared by several URLs only count once
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM pages)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for kind, url, body_hash, size in self._conn.execute(
+                "SELECT kind, url, body_hash, size FROM pages ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM pages WHERE kind = ? AND url = ?", (kind, url))
+            if self._drop_blob_if_unused(body_hash):
+                total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class SearchCache:
+    """
+    Cache search results in `<cache_dir>/search.sqlite` as zlib-compressed JSON.
+
+    :param cache_dir: Root directory of the cache.
+    :param ttl: Seconds a cached result list is served before the search is run again.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "search.sqlite"), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS searches (
+                query TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                domain TEXT NOT NULL,
+                results BLOB NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (query, count, domain)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, query: str, count: int, domain: Optional[str] = None) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, fetched_at FROM searches WHERE query = ? AND count = ? AND domain = ?",
+                (query, count, domain or "")).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, query: str, count: int, domain: Optional[str], results: List[dict]):
+        blob = zlib.compress(json.dumps(results, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                               (query, count, domain or "", blob, time.time()))
+            self._conn.execute("DELETE FROM searches WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding vectors under `<cache_dir>/embeddings`. Vectors of each dimension live in
+    a memory-mapped float32 array (`vectors-<dim>.f32`), one row per slot, and an SQLite index
+    maps each key to its slot. Slots of evicted entries are reused.
+
+    :param cache_dir: Root directory of the cache.
+    :param max_bytes: Total vector size kept before least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 2 << 30):
+        self.root = os.path.join(cache_dir, "embeddings")
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._arrays: Dict[int, np.memmap] = {}
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                slot INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS free_slots (dim INTEGER NOT NULL, slot INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(namespace: str, text: str) -> str:
+        normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+        return hashlib.sha256(f"{namespace}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def _array(self, dim: int, min_rows: int = 0) -> np.memmap:
+        """Return the memory map of `dim`-sized vectors, growing the file to hold `min_rows`."""
+        array = self._arrays.get(dim)
+        if array is not None and len(array) >= min_rows:
+            return array
+        path = os.path.join(self.root, f"vectors-{dim}.f32")
+        rows = os.path.getsize(path) // (dim * 4) if os.path.exists(path) else 0
+        if rows < min_rows or rows == 0:
+            rows = max(min_rows, rows * 2, 1024)
+            if array is not None:
+                array.flush()
+            with open(path, 'ab') as f:
+                f.truncate(rows * dim * 4)
+        array = self._arrays[dim] = np.memmap(path, dtype=np.float32, mode='r+', shape=(rows, dim))
+        return array
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            rows = []
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows += self._conn.execute(
+                    f"SELECT key, dim, slot FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch).fetchall()
+            if not rows:
+                return found
+            self._conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                                   [(time.time(), key) for key, _, _ in rows])
+            self._conn.commit()
+            for key, dim, slot in rows:
+                found[key] = self._array(dim)[slot].tolist()
+        return found
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                dim = len(vector)
+                existing = self._conn.execute("SELECT dim, slot FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if existing and existing[0] == dim:
+                    slot = existing[1]
+                else:
+                    if existing:
+                        self._conn.execute("INSERT INTO free_slots VALUES (?, ?)", existing)
+                    slot = self._allocate(dim)
+                self._array(dim, slot + 1)[slot] = np.asarray(vector, dtype=np.float32)
+                self._conn.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", (key, dim, slot, now))
+            for array in self._arrays.values():
+                array.flush()
+            self._evict()
+            self._conn.commit()
+
+    def _allocate(self, dim: int) -> int:
+        free = self._conn.execute("SELECT rowid, slot FROM free_slots WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+        if free:
+            self._conn.execute("DELETE FROM free_slots WHERE rowid = ?", (free[0],))
+            return free[1]
+        used = self._conn.execute("SELECT MAX(slot) FROM embeddings WHERE dim = ?", (dim,)).fetchone()[0]
+        freed = self._conn.execute("SELECT MAX(slot) FROM free_slots WHERE dim = ?", (dim,)).fetchone()[0]
+        return max(-1 if used is None else used, -1 if freed is None else freed) + 1
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(dim), 0) * 4 FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, dim, slot FROM embeddings ORDER BY accessed_at LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, dim, slot in rows:
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._conn.execute("INSERT INTO free_slots VALUES (?, ?)", (dim, slot))
+                total -= dim * 4
+                if total <= self.max_bytes:
+                    break
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an Embeddings provider with an EmbeddingCache. Texts are looked up by the hash of
+    their normalized form; only misses are sent to the provider, deduplicated and in batches.
+    Queries are cached separately from documents, since some providers embed them differently.
+
+    :param embeddings: The provider embeddings to wrap.
+    :param namespace: Identifies the provider and model, e.g. "openai:text-embedding-3-small".
+    :param store: The cache to use.
+    :param batch_size: Maximum number of texts sent to the provider per call.
+    """
+
+    def __init__(self, embeddings: Embeddings, namespace: str, store: EmbeddingCache, batch_size: int = 250):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.store = store
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.store.key(self.namespace, text) for text in texts]
+        vectors = self.store.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[i:i + self.batch_size]
+            batch_vectors = self.embeddings.embed_documents([missing[key] for key in batch_keys])
+            self.store.put_many(batch_keys, batch_vectors)
+            vectors.update(zip(batch_keys, batch_vectors))
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.store.key(f"{self.namespace}:query", text)
+        vector = self.store.get_many([key]).get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self.store.put_many([key], [vector])
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries: cache misses are deduplicated and sent to the provider together,
+        with embed_queries.
+        """
+        keys = [self.store.key(f"{self.namespace}:query", text) for text in texts]
+        vectors = self.store.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[i:i + self.batch_size]
+            batch_vectors = embed_queries(self.embeddings, [missing[key] for key in batch_keys])
+            self.store.put_many(batch_keys, batch_vectors)
+            vectors.update(zip(batch_keys, batch_vectors))
+        return [list(vectors[key]) for key in keys]
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str], max_concurrency: int = 8) -> List[List[float]]:
+    """
+    Embed search queries in as few provider calls as possible, with the query embedding of the
+    provider: one embed_documents call for providers that embed queries and documents alike, the
+    batch query API of Cohere and Google, and concurrent embed_query calls for other providers.
+    """
+    if not texts:
+        return []
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_queries(texts)
+    # Provider classes are matched by name, so that none of them is imported here
+    name = type(embeddings).__name__
+    if name in SYMMETRIC_EMBEDDINGS:
+        return embeddings.embed_documents(texts)
+    if name == 'CohereEmbeddings':
+        return embeddings.embed(texts, input_type="search_query")
+    if name == 'GoogleGenerativeAIEmbeddings':
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    with ThreadPoolExecutor(max_workers=max(1, min(len(texts), max_concurrency))) as executor:
+        return list(executor.map(embeddings.embed_query, texts))
+
+
+class LLMCache:
+    """
+    Cache chat model responses in `<cache_dir>/llm.sqlite` as zlib-compressed text. Entries are
+    keyed by the provider class, model, temperature and a hash of the exact messages, so any
+    change to the prompt or the retrieved context is a miss.
+
+    :param cache_dir: Root directory of the cache.
+    :param ttl: Seconds a response is reused.
+    :param max_bytes: Total compressed size kept before least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = 7 * 24 * 3600, max_bytes: int = 256 << 20):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "llm.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(chat_llm, messages: list) -> str:
+        payload = {
+            'provider': type(chat_llm).__name__,
+            'model': getattr(chat_llm, 'model_name', None) or getattr(chat_llm, 'model', None),
+            'temperature': getattr(chat_llm, 'temperature', None),
+            'messages': [(getattr(message, 'type', None), message.content) for message in messages],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key: str, response: str):
+        blob = zlib.compress(response.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now))
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def configure_page_cache(**settings) -> PageCache:
+    global _page_cache
+    with _page_cache_lock:
+        _page_cache = PageCache(**settings)
+        return _page_cache
+
+
+def get_page_cache() -> PageCache:
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def configure_search_cache(**settings) -> SearchCache:
+    global _search_cache
+    with _search_cache_lock:
+        _search_cache = SearchCache(**settings)
+        return _search_cache
+
+
+def get_search_cache() -> SearchCache:
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache()
+        return _search_cache
+
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def configure_llm_cache(**settings) -> LLMCache:
+    global _llm_cache
+    with _llm_cache_lock:
+        _llm_cache = LLMCache(**settings)
+        return _llm_cache
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    # Opt-in: responses are only cached once configure_llm_cache was called
+    with _llm_cache_lock:
+        return _llm_cache
@@ -0,0 +1,259 @@
+"""
+Durable checkpoints of the ingestion stages of a run.
+
+Each unit of work of the ingestion pipeline is recorded once it completes: search results per
+query, fetched contents per URL, chunks per URL (with their vectors once embedded), the chunks
+upserted to the vector store and the replaced chunks still to delete from it. An interrupted
+run resumes from there instead of fetching, splitting and embedding everything again, and a
+run is only marked complete once every stage succeeded.
+
+The source manifest outlives runs: it records the content hash of every source stored in an
+index and the ids of its chunks, so an incremental refresh only stores what changed.
+
+Classes:
+- RunCheckpoint:
+    SQLite checkpoint of one run, stored in `<cache_dir>/runs/<backend>/<index_name>`.
+- SourceManifest:
+    Content hash and chunk ids of every source stored in an index.
+
+Functions:
+- get_run_dir(cache_dir: str, backend: str, index_name: str) -> str:
+    Return the run directory of an index.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_community.docstore.document import Document
+
+
+def get_run_dir(cache_dir: str, backend: str, index_name: str) -> str:
+    return os.path.join(cache_dir, "runs", backend, index_name)
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of the ingestion of one index. All methods are thread-safe, since the stages
+    of the pipeline record their work from their own worker threads.
+
+    :param run_dir: Directory of the checkpoint, created if missing.
+    """
+
+    def __init__(self, run_dir: str):
+        self.run_dir = run_dir
+        os.makedirs(run_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(run_dir, "checkpoint.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS searches (query TEXT PRIMARY KEY, sources TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS contents (link TEXT PRIMARY KEY, content TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS splits (link TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                link TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                vector BLOB,
+                upserted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS chunks_link ON chunks (link);
+            CREATE TABLE IF NOT EXISTS stale (id TEXT PRIMARY KEY);
+        """)
+        self._conn.commit()
+
+    def _get_state(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (name, value))
+            self._conn.commit()
+
+    @property
+    def started(self) -> bool:
+        return self._get_state('started_at') is not None
+
+    @property
+    def complete(self) -> bool:
+        return self._get_state('completed_at') is not None
+
+    def mark_started(self):
+        if not self.started:
+            self._set_state('started_at', str(time.time()))
+
+    def mark_complete(self):
+        self._set_state('completed_at', str(time.time()))
+
+    def reset(self, started: bool = False):
+        """
+        Forget everything, e.g. when the vector store was recreated. With `started`, the run is
+        marked started in the same transaction, so it can't be seen as never started.
+        """
+        with self._lock:
+            for table in ('state', 'searches', 'contents', 'splits', 'chunks', 'stale'):
+                self._conn.execute(f"DELETE FROM {table}")
+            if started:
+                self._conn.execute("INSERT INTO state VALUES ('started_at', ?)", (str(time.time()),))
+            self._conn.commit()
+
+    def get_search(self, query: str) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute("SELECT sources FROM searches WHERE query = ?", (query,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_search(self, query: str, sources: List[dict]):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO searches VALUES (?, ?)", (query, json.dumps(sources)))
+            self._conn.commit()
+
+    def get_contents(self, links: List[str]) -> Dict[str, dict]:
+        if not links:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT link, content FROM contents WHERE link IN ({','.join('?' * len(links))})", links).fetchall()
+        return {link: json.loads(content) for link, content in rows}
+
+    def put_contents(self, contents: List[dict]):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO contents VALUES (?, ?)",
+                                   [(content['link'], json.dumps(content)) for content in contents])
+            self._conn.commit()
+
+    def get_chunks(self, link: str) -> Optional[List[Tuple[str, Document, Optional[List[float]], bool]]]:
+        """
+        The (id, document, vector, upserted) chunks of a URL, or None if it was never split.
+        The vector is None until the chunk was embedded.
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM splits WHERE link = ?", (link,)).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT id, text, metadata, vector, upserted FROM chunks WHERE link = ? ORDER BY position",
+                (link,)).fetchall()
+        return [
+            (chunk_id, Document(page_content=text, metadata=json.loads(metadata)),
+             np.frombuffer(vector, dtype=np.float32).tolist() if vector is not None else None, bool(upserted))
+            for chunk_id, text, metadata, vector, upserted in rows
+        ]
+
+    def put_chunks(self, link: str, chunks: List[Tuple[str, Document, Optional[List[float]]]]):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE link = ?", (link,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, link, position, text, metadata, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                [(chunk_id, link, position, doc.page_content, json.dumps(doc.metadata),
+                  np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None)
+                 for position, (chunk_id, doc, vector) in enumerate(chunks)])
+            self._conn.execute("INSERT OR REPLACE INTO splits VALUES (?)", (link,))
+            self._conn.commit()
+
+    def put_vectors(self, ids: List[str], vectors: List[List[float]]):
+        with self._lock:
+            self._conn.executemany("UPDATE chunks SET vector = ? WHERE id = ?",
+                                   [(np.asarray(vector, dtype=np.float32).tobytes(), chunk_id)
+                                    for chunk_id, vector in zip(ids, vectors)])
+            self._conn.commit()
+
+    def mark_upserted(self, ids: List[str]):
+        with self._lock:
+            self._conn.executemany("UPDATE chunks SET upserted = 1 WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+
+    def put_stale(self, ids: List[str]):
+        """Record chunks to delete from the vector store once the new chunks are stored."""
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO stale VALUES (?)", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+
+    def get_stale(self) -> List[str]:
+        with self._lock:
+            return [chunk_id for chunk_id, in self._conn.execute("SELECT id FROM stale")]
+
+    def clear_stale(self, ids: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM stale WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'searches': self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0],
+                'contents': self._conn.execute("SELECT COUNT(*) FROM contents").fetchone()[0],
+                'chunks': self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+                'upserted': self._conn.execute("SELECT COUNT(*) FROM chunks WHERE upserted = 1").fetchone()[0],
+            }
+
+
+class SourceManifest:
+    """
+    Manifest of the sources stored in an index: the hash of each source content and the ids of
+    the chunks stored for it. Chunk ids are derived from the chunk content, so a chunk that did
+    not change keeps its id across refreshes.
+
+    :param run_dir: Directory of the manifest (the run directory of the index).
+    """
+
+    def __init__(self, run_dir: str):
+        os.makedirs(run_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(run_dir, "manifest.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (link TEXT PRIMARY KEY, content_hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, link TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS chunks_link ON chunks (link);
+        """)
+        self._conn.commit()
+
+    def get_hash(self, link: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM sources WHERE link = ?", (link,)).fetchone()
+        return row[0] if row else None
+
+    def get_chunk_ids(self, link: str) -> Set[str]:
+        with self._lock:
+            return {chunk_id for chunk_id, in self._conn.execute("SELECT id FROM chunks WHERE link = ?", (link,))}
+
+    def put_source(self, link: str, content_hash: str, chunk_ids: List[str]) -> List[str]:
+        """Record the new content of a source, and return the ids of its chunks that no longer exist."""
+        with self._lock:
+            previous = {chunk_id for chunk_id, in self._conn.execute("SELECT id FROM chunks WHERE link = ?", (link,))}
+            stale = sorted(previous - set(chunk_ids))
+            self._conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (link, content_hash))
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in stale])
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?)",
+                                   [(chunk_id, link) for chunk_id in chunk_ids])
+            self._conn.commit()
+        return stale
+
+    def links(self) -> Set[str]:
+        with self._lock:
+            return {link for link, in self._conn.execute("SELECT link FROM sources")}
+
+    def remove_sources(self, links: List[str]) -> List[str]:
+        """Forget sources and return the ids of their chunks."""
+        removed = []
+        with self._lock:
+            for link in links:
+                removed += [chunk_id for chunk_id, in self._conn.execute("SELECT id FROM chunks WHERE link = ?", (link,))]
+                self._conn.execute("DELETE FROM chunks WHERE link = ?", (link,))
+                self._conn.execute("DELETE FROM sources WHERE link = ?", (link,))
+            self._conn.commit()
+        return removed
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM sources")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
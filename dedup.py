@@ -0,0 +1,138 @@
+"""
+Cross-query deduplication of crawled sources.
+
+The research queries of a single run return many of the same pages (company homepage,
+Crunchbase profile, press releases) and syndicated copies of the same article. A
+Deduplicator is shared by all queries of a run: it skips URLs that were already fetched and
+drops documents whose text is a near duplicate of one already kept, before anything is
+split, embedded or written to the vector store.
+
+Functions:
+- normalize_url(url: str) -> str:
+    Canonicalize a URL (scheme, host, default port, trailing slash, tracking parameters, fragment).
+- simhash(text: str, shingle_size: int = 3) -> int:
+    Compute the 64-bit SimHash fingerprint of the word shingles of a text.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'ref', 'ref_src', '_hsenc', '_hsmi'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme == 'http':
+        scheme = 'https'
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    tokens = _tokens(text)
+    shingles = {' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+         for shingle in shingles],
+        dtype='>u8')
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    fingerprint = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(fingerprint).tobytes(), 'big')
+
+
+class Deduplicator:
+    """
+    Track the URLs and document fingerprints seen during a run.
+
+    Two documents are near duplicates when the Hamming distance between their SimHash
+    fingerprints is at most `max_distance`. Fingerprints are indexed in `max_distance + 1`
+    bands, so by the pigeonhole principle any near duplicate shares at least one band with
+    the document it duplicates and only those candidates are compared.
+
+    :param max_distance: Maximum number of differing fingerprint bits for a near duplicate.
+    :param shingle_size: Number of words per shingle.
+    :param min_tokens: Documents shorter than this are only checked for exact duplicates.
+    """
+
+    def __init__(self, max_distance: int = 6, shingle_size: int = 3, min_tokens: int = 50):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.min_tokens = min_tokens
+        band_count = max_distance + 1
+        widths = [64 // band_count + (1 if i < 64 % band_count else 0) for i in range(band_count)]
+        offsets = np.cumsum([0] + widths[:-1])
+        self._bands = [(int(offset), (1 << width) - 1) for offset, width in zip(offsets, widths)]
+        self._band_index: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._seen_urls = set()
+        self._seen_texts = set()
+        self._lock = threading.Lock()
+        self.skipped_urls = 0
+        self.skipped_documents = 0
+
+    def filter_sources(self, sources: List[dict]) -> List[dict]:
+        """
+        Keep only sources whose normalized URL has not been seen yet in this run.
+        """
+        kept = []
+        with self._lock:
+            for source in sources:
+                url = normalize_url(source['link'])
+                if url in self._seen_urls:
+                    self.skipped_urls += 1
+                    continue
+                self._seen_urls.add(url)
+                kept.append(source)
+        return kept
+
+    def is_duplicate(self, text: str) -> bool:
+        """
+        Check a document against those seen so far, and remember it if it is new.
+        """
+        tokens = _tokens(text)
+        digest = hashlib.blake2b(' '.join(tokens).encode('utf-8'), digest_size=16).digest()
+        fingerprint = simhash(text, self.shingle_size) if len(tokens) >= self.min_tokens else None
+        with self._lock:
+            if digest in self._seen_texts:
+                self.skipped_documents += 1
+                return True
+            if fingerprint is not None:
+                keys = [(fingerprint >> offset) & mask for offset, mask in self._bands]
+                for key, index in zip(keys, self._band_index):
+                    for candidate in index.get(key, ()):
+                        if bin(candidate ^ fingerprint).count('1') <= self.max_distance:
+                            self.skipped_documents += 1
+                            return True
+                for key, index in zip(keys, self._band_index):
+                    index.setdefault(key, []).append(fingerprint)
+            self._seen_texts.add(digest)
+            return False
+
+    def filter_contents(self, contents: List[dict]) -> List[dict]:
+        """
+        Drop fetched documents that duplicate, or nearly duplicate, one already kept.
+        """
+        return [content for content in contents if not self.is_duplicate(content['page_content'])]
@@ -0,0 +1,99 @@
+"""
+CPU-bound text extraction in a shared process pool.
+
+Parsing keeps a core busy and holds the GIL, so it runs in worker processes instead of the
+threads doing network I/O.
+
+Functions:
+- configure(**settings) -> None:
+    Set the process pool size and the extraction limits, before the pool is first used.
+- get_process_pool() -> ProcessPoolExecutor:
+    Return the shared process pool, starting it on first use.
+- extract_pdf(path: str) -> str:
+    Extract the text of a PDF file, spreading its pages over the process pool.
+- extract_html(html, encoding: str = 'utf-8', output_format: str = 'txt', include_links: bool = True) -> str:
+    Extract the main content of an HTML page with trafilatura in the process pool.
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Union
+
+import pdfplumber
+from trafilatura import extract
+
+PAGES_PER_TASK = 8
+
+_settings = {
+    'max_workers': None,  # Defaults to the number of cores
+    'pdf_max_pages': 100,
+}
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def configure(**settings):
+    unknown = set(settings) - set(_settings)
+    if unknown:
+        raise ValueError(f"Unknown extraction settings: {', '.join(sorted(unknown))}")
+    _settings.update(settings)
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the parent runs the fetch engine loop and other threads
+            _pool = ProcessPoolExecutor(max_workers=_settings['max_workers'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:end]:
+            # Pages without a text layer return None
+            texts.append(page.extract_text() or '')
+            page.close()
+    return texts
+
+
+def extract_pdf(path: str, max_pages: Optional[int] = None) -> str:
+    """
+    Extract the text of the first `max_pages` pages of a PDF (the configured `pdf_max_pages`
+    by default). Pages are extracted in parallel, in ranges of PAGES_PER_TASK, and joined once.
+    """
+    max_pages = max_pages or _settings['pdf_max_pages']
+    with pdfplumber.open(path) as pdf:
+        page_count = min(len(pdf.pages), max_pages)
+
+    pool = get_process_pool()
+    futures = [
+        pool.submit(_extract_pdf_pages, path, start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+    return '\n'.join(text for future in futures for text in future.result() if text)
+
+
+def _extract_html(html: Union[str, bytes], encoding: str, output_format: str, include_links: bool) -> Optional[str]:
+    if isinstance(html, bytes):
+        html = html.decode(encoding or 'utf-8', errors='replace')
+    return extract(html, output_format=output_format, include_links=include_links)
+
+
+def extract_html(html: Union[str, bytes], encoding: str = 'utf-8', output_format: str = 'txt',
+                 include_links: bool = True) -> Optional[str]:
+    """
+    Extract the main content of an HTML page. Raw response bytes can be passed as-is: they
+    are decoded in the worker, which keeps the hand-off to the process a single buffer copy.
+    """
+    return get_process_pool().submit(_extract_html, html, encoding, output_format, include_links).result()
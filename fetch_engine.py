@@ -0,0 +1,307 @@
+"""
+Shared asyncio HTTP fetch engine.
+
+A single pooled httpx.AsyncClient runs on a background event loop, so synchronous callers
+(web_crawler.get_sources, web_crawler.get_links_contents, ...) running in any thread share
+keep-alive connections and the same global and per-host concurrency limits.
+
+Bodies are streamed: the kind of document is decided from the Content-Type header and the
+first bytes of the body, so unsupported (images, videos, archives, ...) and oversized bodies
+are abandoned early, under a byte budget per page and per run. A run (e.g. the research of one
+startup) passes its own DownloadBudget to its fetches, so runs sharing the engine don't share
+their budget.
+
+Functions:
+- sniff_content_kind(content_type: str, head: bytes) -> Optional[str]:
+    Decide whether a body is an HTML page, a PDF, or something we don't extract.
+- configure(**settings) -> FetchEngine:
+    Replace the shared engine with one built from the given settings.
+- get_engine() -> FetchEngine:
+    Return the shared engine, creating it with default settings on first use.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+# Types whose body may still turn out to be HTML once sniffed
+GENERIC_TYPES = ('', 'text/plain', 'application/octet-stream', 'binary/octet-stream')
+HTML_MARKERS = (b'<!doctype html', b'<html', b'<head', b'<body', b'<!--')
+BINARY_SIGNATURES = (
+    b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'RIFF', b'BM',  # Images (and RIFF audio/video)
+    b'PK\x03\x04', b'\x1f\x8b', b'7z\xbc\xaf', b'Rar!',  # Archives
+    b'\x1a\x45\xdf\xa3', b'OggS', b'ID3', b'fLaC', b'\x00\x00\x01\xba',  # Audio and video
+)
+
+
+def sniff_content_kind(content_type: str, head: bytes) -> Optional[str]:
+    """
+    Return 'pdf' or 'html' for bodies we can extract, None otherwise.
+    The first bytes win over the header, which is often missing or wrong.
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(BINARY_SIGNATURES) or head[4:8] == b'ftyp':  # ftyp: MP4/MOV/HEIC
+        return None
+    if content_type == 'application/pdf':
+        return 'pdf'
+    if content_type in HTML_TYPES:
+        return 'html'
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:64].lower()
+    if content_type in GENERIC_TYPES and start.startswith(HTML_MARKERS):
+        return 'html'
+    return None
+
+
+@dataclass
+class DownloadBudget:
+    """
+    The bytes downloaded by the fetches of one run, only updated on the engine loop.
+
+    :param max_bytes: Bytes downloaded before every further fetch of the run is abandoned (None: no limit).
+    """
+    max_bytes: Optional[int] = None
+    bytes_downloaded: int = 0
+    # Fetches abandoned because the budget was exhausted
+    skipped: int = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.max_bytes is not None and self.bytes_downloaded >= self.max_bytes
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    encoding: str = 'utf-8'
+    # 'html' or 'pdf' when the body was sniffed, None otherwise
+    kind: Optional[str] = None
+    # Why the body was not downloaded (unsupported type, over budget, ...)
+    skipped: Optional[str] = None
+    # Bodies streamed to disk (PDFs) are in a temporary file owned by the caller
+    path: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FetchEngine:
+    """
+    Run HTTP fetches on a dedicated event loop with one pooled client.
+
+    :param max_connections: Maximum number of requests in flight across all hosts.
+    :param max_per_host: Maximum number of requests in flight to a single host.
+    :param timeout: Default read/write/pool timeout in seconds.
+    :param connect_timeout: Default connect timeout in seconds.
+    :param pdf_max_bytes: PDFs are streamed to a temporary file and abandoned past this size.
+    :param page_max_bytes: Other bodies are abandoned past this size.
+    :param run_max_bytes: Budget of the fetches not given their own DownloadBudget (None: no limit).
+    """
+
+    def __init__(self, max_connections: int = 100, max_per_host: int = 8,
+                 timeout: float = 8.0, connect_timeout: float = 5.0, pdf_max_bytes: int = 50 * 1024 * 1024,
+                 page_max_bytes: int = 5 * 1024 * 1024, run_max_bytes: Optional[int] = None):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pdf_max_bytes = pdf_max_bytes
+        self.page_max_bytes = page_max_bytes
+        self.budget = DownloadBudget(run_max_bytes)
+        # Bytes downloaded by every fetch, whatever its budget. Only updated on the engine loop
+        self.bytes_downloaded = 0
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fetch-engine", daemon=True)
+        self._thread.start()
+        self.run(self._open())
+
+    async def _open(self):
+        # The client and semaphores must be created on the engine loop
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            follow_redirects=True,
+        )
+        self._global = asyncio.Semaphore(self.max_connections)
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def afetch(self, url: str, headers: Optional[dict] = None, timeout: Optional[float] = None,
+                     sniff: bool = True, budget: Optional[DownloadBudget] = None) -> FetchResult:
+        """
+        Fetch a URL on the engine loop. Raises httpx.HTTPError on transport errors;
+        HTTP error statuses are returned as-is, without their body.
+
+        With `sniff`, only HTML and PDF bodies are downloaded (see FetchResult.kind and
+        FetchResult.skipped), PDFs are streamed to a temporary file (see FetchResult.path),
+        and bodies are abandoned as soon as they exceed the page byte budget or the `budget` of
+        the run (the engine budget by default). Without it the whole body is read, e.g. for API
+        responses.
+        """
+        budget = self.budget if budget is None else budget
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        # Per-host slot first: requests queued behind a busy host must not hold global slots
+        async with self._host_limit(url), self._global:
+            async with self._client.stream('GET', url, headers=headers, **kwargs) as response:
+                result = FetchResult(url=str(response.url), status_code=response.status_code,
+                                     headers=response.headers, content=b'')
+                if not sniff:
+                    result.content = await response.aread()
+                    result.encoding = response.encoding
+                    return result
+                if response.status_code >= 300:
+                    return result
+
+                content_type = response.headers.get('Content-Type', '')
+                max_bytes = self.pdf_max_bytes if content_type.startswith('application/pdf') else self.page_max_bytes
+                length = response.headers.get('Content-Length', '')
+                if length.isdigit() and int(length) > max_bytes:
+                    result.skipped = f"Body of {length} bytes is larger than {max_bytes} bytes"
+                    return result
+                if budget.exhausted:
+                    result.skipped = "Download budget of the run exhausted"
+                    budget.skipped += 1
+                    return result
+
+                chunks = response.aiter_bytes()
+                head = await anext(chunks, b'')
+                result.kind = sniff_content_kind(content_type, head)
+                if result.kind is None:
+                    result.skipped = f"Unsupported content type: {content_type or 'unknown'}"
+                elif result.kind == 'pdf':
+                    result.path = await self._stream_to_file(result, head, chunks, self.pdf_max_bytes, budget)
+                else:
+                    body = await self._read(result, head, chunks, self.page_max_bytes, budget)
+                    if body is not None:
+                        result.content = body
+                        result.encoding = response.encoding
+                return result
+
+    def _consume(self, result: FetchResult, chunk_size: int, body_size: int, max_bytes: int,
+                 budget: DownloadBudget) -> bool:
+        """Account for a downloaded chunk; False (and result.skipped set) once over budget."""
+        self.bytes_downloaded += chunk_size
+        budget.bytes_downloaded += chunk_size
+        if body_size > max_bytes:
+            result.skipped = f"Body larger than {max_bytes} bytes"
+        elif budget.max_bytes is not None and budget.bytes_downloaded > budget.max_bytes:
+            result.skipped = "Download budget of the run exhausted"
+            budget.skipped += 1
+        return result.skipped is None
+
+    @staticmethod
+    async def _body(head: bytes, chunks):
+        yield head
+        async for chunk in chunks:
+            yield chunk
+
+    async def _read(self, result: FetchResult, head: bytes, chunks, max_bytes: int,
+                    budget: DownloadBudget) -> Optional[bytes]:
+        body = bytearray()
+        async for chunk in self._body(head, chunks):
+            body += chunk
+            if not self._consume(result, len(chunk), len(body), max_bytes, budget):
+                return None
+        return bytes(body)
+
+    async def _stream_to_file(self, result: FetchResult, head: bytes, chunks, max_bytes: int,
+                              budget: DownloadBudget) -> Optional[str]:
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in self._body(head, chunks):
+                    size += len(chunk)
+                    if not self._consume(result, len(chunk), size, max_bytes, budget):
+                        break
+                    f.write(chunk)
+            if result.skipped:
+                os.remove(path)
+                return None
+            return path
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch(self, url: str, headers: Optional[dict] = None, timeout: Optional[float] = None,
+              sniff: bool = True, budget: Optional[DownloadBudget] = None) -> FetchResult:
+        return self.run(self.afetch(url, headers=headers, timeout=timeout, sniff=sniff, budget=budget))
+
+    def fetch_many(self, urls: List[str], timeout: Optional[float] = None,
+                   headers: Optional[List[Optional[dict]]] = None,
+                   budget: Optional[DownloadBudget] = None) -> List[Optional[FetchResult]]:
+        """
+        Fetch all URLs concurrently, with optional per-URL request headers.
+        Failed fetches are returned as None, in input order.
+        """
+        headers = headers or [None] * len(urls)
+
+        async def gather():
+            return await asyncio.gather(*(self.afetch(url, headers=url_headers, timeout=timeout, budget=budget)
+                                          for url, url_headers in zip(urls, headers)),
+                                        return_exceptions=True)
+
+        return [None if isinstance(result, BaseException) else result for result in self.run(gather())]
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        try:
+            self.run(self._client.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_engine: Optional[FetchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def configure(**settings) -> FetchEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = FetchEngine(**settings)
+        return _engine
+
+
+def get_engine() -> FetchEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
+
+
+@atexit.register
+def _close_engine():
+    if _engine is not None:
+        _engine.close()
@@ -1,31 +1,69 @@
+"""
+Chat and embedding models of the supported providers.
+
+Provider SDKs are heavy to import, so none is imported with this module: the provider
+registry maps each model class to its module, and `get_model` / `get_embedding_model`
+only import the backend they select. Classes are also reachable as module attributes
+(`models.ChatOpenAI`), imported on first access.
+
+Functions:
+- split_provider_model(provider_model: str) -> Tuple[str, str]:
+    Split a `provider:model` string.
+- get_model(provider_model: str, temperature: float = 0.0) -> BaseChatModel:
+    Get a chat model from a provider and model name.
+- get_embedding_model(provider_model: str, cache_dir: str = None, cache_max_bytes: int = 2 << 30) -> Embeddings:
+    Get an embedding model from a provider and model name.
+"""
+
+import importlib
 import os
 from typing import Tuple
-from langchain.prompts.prompt import PromptTemplate
-from langchain.retrievers.multi_query import MultiQueryRetriever
-
-from langchain_aws import BedrockEmbeddings
-from langchain_aws.chat_models.bedrock_converse import ChatBedrockConverse
-from langchain_cohere import ChatCohere
-from langchain_fireworks.chat_models import ChatFireworks
-from langchain_fireworks.embeddings import FireworksEmbeddings
-from langchain_groq.chat_models import ChatGroq
-from langchain_openai import ChatOpenAI
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_mistralai.chat_models import ChatMistralAI
-from langchain_mistralai.embeddings import MistralAIEmbeddings
-from langchain_ollama.chat_models import ChatOllama
-from langchain_ollama.embeddings import OllamaEmbeddings
-from langchain_cohere.embeddings import CohereEmbeddings
-from langchain_cohere.chat_models import ChatCohere
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
-from langchain_community.chat_models import ChatPerplexity
-from langchain_together import ChatTogether
-from langchain_together.embeddings import TogetherEmbeddings
 from langchain.chat_models.base import BaseChatModel
 from langchain.embeddings.base import Embeddings
 
+from cache import CachedEmbeddings, EmbeddingCache
+
+# Module of every provider class, imported when a provider is selected
+_PROVIDER_CLASSES = {
+    'BedrockEmbeddings': 'langchain_aws',
+    'ChatBedrockConverse': 'langchain_aws.chat_models.bedrock_converse',
+    'ChatCohere': 'langchain_cohere.chat_models',
+    'CohereEmbeddings': 'langchain_cohere.embeddings',
+    'ChatFireworks': 'langchain_fireworks.chat_models',
+    'FireworksEmbeddings': 'langchain_fireworks.embeddings',
+    'ChatGroq': 'langchain_groq.chat_models',
+    'ChatOpenAI': 'langchain_openai',
+    'OpenAIEmbeddings': 'langchain_openai.embeddings',
+    'ChatMistralAI': 'langchain_mistralai.chat_models',
+    'MistralAIEmbeddings': 'langchain_mistralai.embeddings',
+    'ChatOllama': 'langchain_ollama.chat_models',
+    'OllamaEmbeddings': 'langchain_ollama.embeddings',
+    'ChatGoogleGenerativeAI': 'langchain_google_genai',
+    'GoogleGenerativeAIEmbeddings': 'langchain_google_genai.embeddings',
+    'ChatPerplexity': 'langchain_community.chat_models',
+    'ChatTogether': 'langchain_together',
+    'TogetherEmbeddings': 'langchain_together.embeddings',
+}
+
+
+def _load(name: str):
+    """
+    Return a provider class, importing its module on first use.
+    A class already set on the module (imported before, or patched by a test) is returned as is.
+    """
+    if name in globals():
+        return globals()[name]
+    provider_class = getattr(importlib.import_module(_PROVIDER_CLASSES[name]), name)
+    globals()[name] = provider_class
+    return provider_class
+
+
+def __getattr__(name: str):
+    if name in _PROVIDER_CLASSES:
+        return _load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def split_provider_model(provider_model: str) -> Tuple[str, str]:
     parts = provider_model.split(':', 1)
     provider = parts[0]
@@ -43,48 +81,48 @@ def get_model(provider_model: str, temperature: float = 0.0) -> BaseChatModel:
             case 'bedrock':
                 if model is None:
                     model = "anthropic.claude-3-sonnet-20240229-v1:0"
-                chat_llm = ChatBedrockConverse(model=model, temperature=temperature)
+                chat_llm = _load('ChatBedrockConverse')(model=model, temperature=temperature)
             case 'cohere':
                 if model is None:
                     model = 'command-r-plus'
-                chat_llm = ChatCohere(model=model, temperature=temperature)
+                chat_llm = _load('ChatCohere')(model=model, temperature=temperature)
             case 'fireworks':
                 if model is None:
                     model = 'accounts/fireworks/models/llama-v3p1-8b-instruct'
-                chat_llm = ChatFireworks(model_name=model, temperature=temperature, max_tokens=120000)
+                chat_llm = _load('ChatFireworks')(model_name=model, temperature=temperature, max_tokens=120000)
             case 'googlegenerativeai':
                 if model is None:
                     model = "gemini-1.5-flash"
-                chat_llm = ChatGoogleGenerativeAI(model=model, temperature=temperature, 
+                chat_llm = _load('ChatGoogleGenerativeAI')(model=model, temperature=temperature, 
                                                   max_tokens=None, timeout=None, max_retries=2,)
             case 'groq':
                 if model is None:
                     model = 'llama-3.1-8b-instant'
-                chat_llm = ChatGroq(model_name=model, temperature=temperature)
+                chat_llm = _load('ChatGroq')(model_name=model, temperature=temperature)
             case 'ollama':
                 if model is None:
                     model = 'llama3.1'
-                chat_llm = ChatOllama(model=model, temperature=temperature)
+                chat_llm = _load('ChatOllama')(model=model, temperature=temperature)
             case 'openai':
                 if model is None:
                     model = "gpt-4o-mini"
-                chat_llm = ChatOpenAI(model=model, temperature=temperature)
+                chat_llm = _load('ChatOpenAI')(model=model, temperature=temperature)
             case 'openrouter':
                 if model is None:
                     model = "google/gemini-flash-1.5-exp"
-                chat_llm = ChatOpenAI(model=model, temperature=temperature, base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
+                chat_llm = _load('ChatOpenAI')(model=model, temperature=temperature, base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
             case 'mistral':
                 if model is None:
                     model = "mistral-large-latest"
-                chat_llm = ChatMistralAI(model=model, temperature=temperature)
+                chat_llm = _load('ChatMistralAI')(model=model, temperature=temperature)
             case 'perplexity':
                 if model is None:
                     model = 'llama-3.1-sonar-small-128k-online'
-                chat_llm = ChatPerplexity(model=model, temperature=temperature)
+                chat_llm = _load('ChatPerplexity')(model=model, temperature=temperature)
             case 'together':
                 if model is None:
                     model = 'meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo'
-                chat_llm = ChatTogether(model=model, temperature=temperature)
+                chat_llm = _load('ChatTogether')(model=model, temperature=temperature)
             case _:
                 raise ValueError(f"Unknown LLM provider {provider}")
     except Exception as e:
@@ -93,48 +131,59 @@ def get_model(provider_model: str, temperature: float = 0.0) -> BaseChatModel:
     return chat_llm
 
 
-def get_embedding_model(provider_model: str) -> Embeddings:
+def get_embedding_model(provider_model: str, cache_dir: str = None, cache_max_bytes: int = 2 << 30) -> Embeddings:
+    """
+    Get an embedding model from a provider and model name.
+    With a cache_dir, the model is wrapped in a persistent embedding cache so that
+    texts already embedded by the same provider and model are not sent again.
+    returns Embeddings
+    """
     provider, model = split_provider_model(provider_model)
     match provider:
         case 'bedrock':
             if model is None:
                 model = "amazon.titan-embed-text-v2:0"
-            embedding_model = BedrockEmbeddings(model_id=model)
+            embedding_model = _load('BedrockEmbeddings')(model_id=model)
         case 'cohere':
             if model is None:
                 model = "embed-english-light-v3.0"
-            embedding_model = CohereEmbeddings(model=model)
+            embedding_model = _load('CohereEmbeddings')(model=model)
         case 'fireworks':
             if model is None:
                 model = 'nomic-ai/nomic-embed-text-v1.5'
-            embedding_model = FireworksEmbeddings(model=model)
+            embedding_model = _load('FireworksEmbeddings')(model=model)
         case 'ollama':
             if model is None:
                 model = 'nomic-embed-text:latest'
-            embedding_model = OllamaEmbeddings(model=model)
+            embedding_model = _load('OllamaEmbeddings')(model=model)
         case 'openai':
             if model is None:
                 model = "text-embedding-3-small"
-            embedding_model = OpenAIEmbeddings(model=model)
+            embedding_model = _load('OpenAIEmbeddings')(model=model)
         case 'googlegenerativeai':
             if model is None:
                 model = "models/embedding-001"
-            embedding_model = GoogleGenerativeAIEmbeddings(model=model)
+            embedding_model = _load('GoogleGenerativeAIEmbeddings')(model=model)
         case 'groq':
-            embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+            provider, model = 'openai', "text-embedding-3-small"
+            embedding_model = _load('OpenAIEmbeddings')(model=model)
         case 'mistral':
             if model is None:
                 model = "mistral-embed"
-            embedding_model = MistralAIEmbeddings(model=model)
+            embedding_model = _load('MistralAIEmbeddings')(model=model)
         case 'perplexity':
             raise ValueError(f"Cannot use Perplexity for embedding model")
         case 'together':
             if model is None:
                 model = 'togethercomputer/m2-bert-80M-2k-retrieval'
-            embedding_model = TogetherEmbeddings(model=model)
+            embedding_model = _load('TogetherEmbeddings')(model=model)
         case _:
             raise ValueError(f"Unknown LLM provider {provider}")
 
+    if cache_dir:
+        store = EmbeddingCache(cache_dir=cache_dir, max_bytes=cache_max_bytes)
+        embedding_model = CachedEmbeddings(embedding_model, namespace=f"{provider}:{model}", store=store)
+
     return embedding_model
 
 
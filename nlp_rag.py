@@ -1,23 +1,51 @@
-import spacy
 from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from functools import lru_cache
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from langsmith import Client, traceable
 import concurrent.futures
+import threading
+
+SPACY_MODEL = "en_core_web_md"
+
+# Splitting only needs sentence boundaries and the static word vectors (which do not depend on
+# any component): the tagger, parser, NER and lemmatizer are not loaded at all
+SPACY_EXCLUDED_PIPES = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"]
 
 # Function to load or download the spaCy model
-def get_nlp_model(model="en_core_web_md"):
+def get_nlp_model(model=SPACY_MODEL, **load_kwargs):
+    import spacy
+
     if not spacy.util.is_package(model):
         print(f"Downloading {model} model...")
         spacy.cli.download(model)
         print("Model downloaded successfully!")
-    nlp = spacy.load(model)
+    nlp = spacy.load(model, **load_kwargs)
     return nlp
 
-# Initialize the spaCy model globally to share across threads
-nlp = get_nlp_model("en_core_web_md")
+_nlp_models = {}
+_nlp_lock = threading.Lock()
+
+def get_nlp(model: str = SPACY_MODEL):
+    """
+    The spaCy model shared across threads, loaded (and downloaded if needed) on first use.
+    Only the sentence recognizer runs in `nlp.pipe`; `nlp.make_doc` tokenizes without any pipe.
+    """
+    nlp = _nlp_models.get(model)
+    if nlp is not None:
+        return nlp
+    # Threads asking for the model at once wait for a single load (or download)
+    with _nlp_lock:
+        nlp = _nlp_models.get(model)
+        if nlp is None:
+            nlp = get_nlp_model(model, exclude=SPACY_EXCLUDED_PIPES)
+            # The statistical sentence recognizer replaces the excluded parser
+            if "senter" in nlp.disabled:
+                nlp.enable_pipe("senter")
+            elif "senter" not in nlp.pipe_names:
+                nlp.add_pipe("sentencizer")
+            _nlp_models[model] = nlp
+    return nlp
 
 @lru_cache(maxsize=10000)
 def get_sentence_vector(sentence_text: str) -> tuple:
@@ -27,9 +55,93 @@ def get_sentence_vector(sentence_text: str) -> tuple:
     :param sentence_text: The sentence text.
     :return: The vector representation as a tuple.
     """
-    doc = nlp(sentence_text)
+    # Document vectors average the static word vectors, tokenizing is enough
+    doc = get_nlp().make_doc(sentence_text)
     return tuple(doc.vector)
 
+def token_vectors(doc) -> np.ndarray:
+    """
+    The (n_tokens, dim) matrix of the static word vectors of a parsed doc, zero for
+    out-of-vocabulary tokens (the same vectors as `token.vector`).
+
+    :param doc: A spaCy doc.
+    :return: The token vector matrix.
+    """
+    vectors = doc.vocab.vectors
+    if getattr(vectors, "mode", "default") != "default" or not vectors.size or not len(doc):
+        # Floret vectors are computed from subwords: fall back to spaCy for each token
+        return np.array([token.vector for token in doc], dtype=np.float32).reshape(len(doc), -1)
+    from spacy.attrs import ORTH
+
+    rows = np.asarray(vectors.find(keys=doc.to_array(ORTH).tolist()))
+    matrix = np.asarray(vectors.data, dtype=np.float32)[rows]
+    matrix[rows < 0] = 0.0
+    return matrix
+
+def sentence_vectors(doc, sentences) -> np.ndarray:
+    """
+    The (n_sentences, dim) matrix of the sentence vectors of a parsed doc: the mean of the
+    vectors of the tokens of each sentence, like `sent.vector`, without re-parsing the sentences.
+
+    :param doc: The spaCy doc of the sentences.
+    :param sentences: The consecutive sentence spans of the doc (`doc.sents`).
+    :return: The sentence vector matrix.
+    """
+    starts = np.array([sent.start for sent in sentences])
+    lengths = np.diff(np.append(starts, sentences[-1].end))
+    sums = np.add.reduceat(token_vectors(doc)[:sentences[-1].end], starts, axis=0)
+    return sums / lengths[:, None].astype(np.float32)
+
+def adjacent_similarities(vectors: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarities of consecutive rows: element i compares rows i and i + 1.
+    A zero vector has a similarity of 0 with every row, like sklearn's `cosine_similarity`.
+
+    :param vectors: A (n, dim) matrix.
+    :return: The (n - 1,) similarities.
+    """
+    norms = np.linalg.norm(vectors, axis=1)
+    unit = vectors / np.where(norms == 0, 1, norms)[:, None]
+    return np.einsum('ij,ij->i', unit[:-1], unit[1:])
+
+def chunk_starts(similarities: np.ndarray, max_chunk_size: int, similarity_threshold: float) -> np.ndarray:
+    """
+    Index of the first sentence of every chunk. A chunk starts at sentence 0, at every sentence
+    less similar to the previous one than the threshold, and after every `max_chunk_size`
+    sentences since the previous start.
+
+    :param similarities: The similarities of consecutive sentences.
+    :param max_chunk_size: Maximum number of sentences per chunk.
+    :param similarity_threshold: Threshold below which a new chunk starts.
+    :return: The sorted chunk starts.
+    """
+    n_sentences = len(similarities) + 1
+    dissimilar = np.concatenate(([True], similarities < similarity_threshold))
+    # Offset of each sentence in its run of similar sentences, which is cut every max_chunk_size
+    segment_starts = np.flatnonzero(dissimilar)
+    offsets = np.arange(n_sentences) - segment_starts[np.cumsum(dissimilar) - 1]
+    return np.flatnonzero(offsets % max(1, max_chunk_size) == 0)
+
+def split_doc(doc, max_chunk_size: int = 100, similarity_threshold: float = 0.5) -> List[str]:
+    """
+    Split a parsed doc into chunks of consecutive similar sentences.
+
+    :param doc: A spaCy doc with sentence boundaries.
+    :param max_chunk_size: Maximum number of sentences per chunk.
+    :param similarity_threshold: Threshold below which a new chunk starts.
+    :return: The chunks of the doc.
+    """
+    sentences = list(doc.sents)
+    if not sentences:
+        return []
+
+    # Sentence vectors come from the parsed doc, and breakpoints from array operations
+    similarities = adjacent_similarities(sentence_vectors(doc, sentences))
+    starts = chunk_starts(similarities, max_chunk_size, similarity_threshold)
+    texts = [sent.text for sent in sentences]
+    bounds = np.append(starts, len(sentences))
+    return [' '.join(texts[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
 def semantic_splitting_batch(
         documents: List[str],
         max_chunk_size: int = 100,
@@ -43,48 +155,9 @@ def semantic_splitting_batch(
     :param similarity_threshold: Threshold below which a new chunk starts.
     :return: A list where each element is a list of chunks for a document.
     """
-    # Process all documents in a single spaCy pipeline run
-    docs = list(nlp.pipe(documents))
-    all_doc_chunks = []
-
-    for doc in docs:
-        sentences = list(doc.sents)
-
-        if not sentences:
-            all_doc_chunks.append([])
-            continue
-
-        # Generate embeddings for all sentences using cached vectors
-        sentence_embeddings = np.array([get_sentence_vector(sent.text) for sent in sentences])
-
-        chunks = []
-        current_chunk = [sentences[0].text]
-        current_chunk_size = 1
-
-        for i in range(1, len(sentences)):
-            # Compute cosine similarity between consecutive sentence embeddings
-            similarity = cosine_similarity(
-                sentence_embeddings[i - 1].reshape(1, -1),
-                sentence_embeddings[i].reshape(1, -1)
-            )[0][0]  # Properly access the similarity score
-
-            if similarity < similarity_threshold or current_chunk_size >= max_chunk_size:
-                # Push the current chunk to chunks
-                chunks.append(' '.join(current_chunk))
-                # Start a new chunk
-                current_chunk = [sentences[i].text]
-                current_chunk_size = 1
-            else:
-                current_chunk.append(sentences[i].text)
-                current_chunk_size += 1
-
-        # Push the last chunk
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-
-        all_doc_chunks.append(chunks)
-
-    return all_doc_chunks
+    # Process all documents in a single spaCy pipeline run (sentence recognition only)
+    docs = list(get_nlp().pipe(documents))
+    return [split_doc(doc, max_chunk_size, similarity_threshold) for doc in docs]
 
 def process_batch(batch: List[Dict]) -> List[Dict]:
     """
@@ -138,7 +211,7 @@ def semantic_split_documents(contents: List[Dict], batch_size: int = 10) -> List
     
     return all_chunks
 
-def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
+def semantic_search(query, chunks, nlp=None, top_n=10, similarity_threshold=0.5):
     """
     Perform semantic search to find the most relevant text chunks related to the query.
 
@@ -146,7 +219,7 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
         query (str): The search query provided by the user.
         chunks (list of dict): A list of text chunks where each chunk is a dictionary
                               containing at least a 'text' key.
-        nlp: The spaCy language model.
+        nlp (optional): The spaCy language model. Defaults to the shared model of `get_nlp`.
         top_n (int, optional): The maximum number of top relevant chunks to return. Defaults to 5.
         similarity_threshold (float, optional): The minimum similarity score a chunk must
                                                 have to be considered relevant. Defaults to 0.5.
@@ -157,15 +230,15 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
     """
     import numpy as np
 
+    if nlp is None:
+        nlp = get_nlp()
+
     # ----------------------------
     # Step 1: Precompute Query Vector
     # ----------------------------
-    # Disable all pipeline components except 'tok2vec' to speed up processing and
-    # focus only on generating the vector representation.
-    with nlp.disable_pipes(*[pipe for pipe in nlp.pipe_names if pipe != 'tok2vec']):
-        # Process the query to obtain its vector representation.
-        query_doc = nlp(query)
-        query_vector = query_doc.vector
+    # Vectors average the static word vectors, so only the tokenizer runs: no pipeline
+    # component is needed to generate the vector representation.
+    query_vector = nlp.make_doc(query).vector
 
     # Compute the norm (magnitude) of the query vector and add a small epsilon to
     # prevent division by zero in similarity calculations.
@@ -178,29 +251,10 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
     texts = [chunk['text'] for chunk in chunks]
 
     # ----------------------------
-    # Step 3: Define Vector Computation Function
-    # ----------------------------
-    def compute_vector(text: str) -> np.ndarray:
-        """
-        Compute the vector representation of a given text using spaCy.
-
-        Args:
-            text (str): The text to process.
-
-        Returns:
-            numpy.ndarray: The vector representation of the text.
-        """
-        # Disable all pipeline components except 'tok2vec' to optimize performance.
-        with nlp.disable_pipes(*[pipe for pipe in nlp.pipe_names if pipe != 'tok2vec']):
-            # Process the text to obtain its vector.
-            doc = nlp(text)
-            return doc.vector
-
-    # ----------------------------
-    # Step 4: Compute Vectors for All Chunks in Parallel
+    # Step 3: Compute Vectors for All Chunks
     # ----------------------------
-    with ThreadPoolExecutor() as executor:
-        chunk_vectors = list(executor.map(compute_vector, texts))
+    # Tokenize the texts in a single stream, without running any pipeline component.
+    chunk_vectors = [doc.vector for doc in nlp.tokenizer.pipe(texts)]
 
     # Check if chunk_vectors is empty to prevent AxisError
     if not chunk_vectors:
@@ -218,7 +272,7 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
     chunk_norms = np.linalg.norm(chunk_vectors, axis=1) + 1e-8
 
     # ----------------------------
-    # Step 5: Calculate Cosine Similarities
+    # Step 4: Calculate Cosine Similarities
     # ----------------------------
     # Compute the cosine similarity between the query vector and each chunk vector.
     # This is done by taking the dot product of the chunk vectors with the query vector
@@ -226,7 +280,7 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
     similarities = np.dot(chunk_vectors, query_vector) / (chunk_norms * query_norm)
 
     # ----------------------------
-    # Step 6: Filter and Sort Relevant Chunks
+    # Step 5: Filter and Sort Relevant Chunks
     # ----------------------------
     # Pair each chunk with its similarity score and filter out those below the threshold.
     results = [
@@ -237,7 +291,7 @@ def semantic_search(query, chunks, nlp, top_n=10, similarity_threshold=0.5):
     results.sort(key=lambda x: x[1], reverse=True)
 
     # ----------------------------
-    # Step 7: Return Top N Relevant Chunks
+    # Step 6: Return Top N Relevant Chunks
     # ----------------------------
     # Return only the top_n chunks that are most relevant to the query.
     return results[:top_n]
@@ -261,8 +315,8 @@ def query_rag(chat_llm, query, relevant_results):
     # Get the RAG prompt template and format it with the query and context
     messages = wr.get_rag_prompt(query, formatted_chunks)  
 
-    # Generate a response using the chat LLM
-    draft = chat_llm.invoke(messages).content
+    # Generate a response using the chat LLM, or reuse the cached one
+    draft = wr.invoke_llm(chat_llm, messages)
     return draft
 
 # Function to perform semantic splitting of documents
@@ -0,0 +1,158 @@
+"""
+Streaming staged pipeline connected by bounded queues.
+
+Each stage runs its own pool of worker threads, reads items from the queue in front of it and
+puts whatever its function yields on the queue of the next stage. Because queues are bounded,
+a slow stage applies back-pressure to the stages before it, while every stage keeps working
+on the items it already has. Total run time approaches the time of the slowest stage instead
+of the sum of all stages.
+
+Classes:
+- Pipeline:
+    Chain stages with `add_stage` and feed items with `run`.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+@dataclass
+class _Stage:
+    name: str
+    func: Callable[[Any], Optional[Iterable[Any]]]
+    workers: int
+    batch_size: Optional[int]
+    flush_seconds: Optional[float]
+    stats: StageStats
+
+
+class Pipeline:
+    """
+    A chain of stages. A stage function takes one item (or a list of items when the stage
+    has a `batch_size`) and returns an iterable of items for the next stage, or None.
+    A partial batch is flushed once its first item waited `flush_seconds`, so a batched stage
+    starts working while the stages before it still produce items.
+    Exceptions raised by a stage function are printed and counted, and the item is dropped.
+
+    :param queue_size: Maximum number of items waiting in front of each stage.
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.stages: List[_Stage] = []
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1, batch_size: Optional[int] = None,
+                  flush_seconds: Optional[float] = 1.0) -> 'Pipeline':
+        self.stages.append(_Stage(name, func, max(1, workers), batch_size, flush_seconds, StageStats(name)))
+        return self
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """
+        Push every item through the pipeline and return what the last stage yields.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        results_lock = threading.Lock()
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        def emit(index, outputs):
+            if outputs is None:
+                return
+            stats = self.stages[index].stats
+            for output in outputs:
+                with stats._lock:
+                    stats.items_out += 1
+                if index + 1 < len(self.stages):
+                    queues[index + 1].put(output)
+                else:
+                    with results_lock:
+                        results.append(output)
+
+        def call(index, stage, payload):
+            started = time.perf_counter()
+            try:
+                # Drain generators here so their errors are attributed to this stage
+                outputs = list(stage.func(payload) or ())
+            except Exception as e:
+                print(f"Error in pipeline stage {stage.name}: {e}")
+                with stage.stats._lock:
+                    stage.stats.errors += 1
+                return
+            finally:
+                with stage.stats._lock:
+                    stage.stats.busy_seconds += time.perf_counter() - started
+            emit(index, outputs)
+
+        def worker(index, stage):
+            batch = []
+            deadline = None  # When the partial batch is flushed, for batched stages with flush_seconds
+            while True:
+                if batch and deadline is not None:
+                    try:
+                        item = queues[index].get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        # Flush the partial batch instead of waiting for a full one
+                        call(index, stage, batch)
+                        batch = []
+                        continue
+                else:
+                    item = queues[index].get()
+                if item is _DONE:
+                    break
+                with stage.stats._lock:
+                    stage.stats.items_in += 1
+                if stage.batch_size is None:
+                    call(index, stage, item)
+                    continue
+                if not batch and stage.flush_seconds is not None:
+                    deadline = time.monotonic() + stage.flush_seconds
+                batch.append(item)
+                if len(batch) >= stage.batch_size or (deadline is not None and time.monotonic() >= deadline):
+                    call(index, stage, batch)
+                    batch = []
+            if batch:
+                call(index, stage, batch)
+            # The last worker of a stage to finish closes the next stage
+            with remaining_lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    queues[index + 1].put(_DONE)
+
+        threads = [
+            threading.Thread(target=worker, args=(index, stage), name=f"{stage.name}-{n}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        if self.stages:
+            for item in items:
+                queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        return results
+
+    @property
+    def stats(self) -> List[StageStats]:
+        return [stage.stats for stage in self.stages]
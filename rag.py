@@ -13,24 +13,56 @@ Functions:
 - get_rag_prompt(question: str, context: str) -> list:
     Get the prompt messages for retrieval-augmented generation (RAG).
 - format_docs(docs: list) -> str:
-    Format the retrieved documents into an XML string.
-- build_rag_prompt(question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = []) -> list:
+    Format the retrieved documents into a compact XML string.
+- count_tokens(text: str, model: str = None) -> int:
+    Count the tokens of a text with tiktoken, or estimate them when it is not installed.
+- pack_docs(docs: list, max_tokens: int, model: str = None) -> list:
+    Keep the most relevant, non-redundant documents that fit in a token budget.
+- build_rag_prompt(question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = [], context_tokens: int = None) -> list:
     Build the RAG prompt by retrieving relevant documents and formatting them.
+- invoke_llm(chat_llm: BaseChatModel, messages: list, callbacks: list = []) -> str:
+    Invoke the chat model and return its answer as a string, through the LLM cache when enabled.
 - query_rag(chat_llm: BaseChatModel, question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = []) -> str:
     Perform RAG using a single query to retrieve relevant documents and generate an answer.
+- build_rag_prompts(queries: list, vectorstore, top_k: int = 10, max_concurrency: int = 8) -> list:
+    Build the RAG prompts of several (question, search_query) pairs, embedding the queries at once.
+- query_rag_batch(chat_llm: BaseChatModel, queries: list, vectorstore, top_k: int = 10, max_concurrency: int = 4) -> list:
+    Answer several (question, search_query) pairs concurrently, keeping their order.
+- add_embeddings(vector_store, documents: list, embeddings: list, ids: list = None) -> list:
+    Add documents with precomputed embeddings to a vector store without embedding them again.
+- split_docs_semantic_with_vectors(contents: list, embedding_model) -> tuple:
+    Split documents semantically and derive each chunk vector from the sentence embeddings.
+- compare_chunk_vectors(documents: list, vectors: list, embedding_model) -> dict:
+    Measure how close derived chunk vectors are to embedding the chunks directly.
 
 Note: The multi_query_rag function mentioned in the original docstring is not present in the provided code.
 """
 
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
 from langchain.schema import SystemMessage, HumanMessage
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_experimental.text_splitter import SemanticChunker
 from langsmith import traceable
 from langchain.prompts import load_prompt
 from langchain.chat_models.base import BaseChatModel
-from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.document import Document
 
+import cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 
 
 def split_docs(contents):
@@ -76,9 +108,107 @@ def split_docs_semantic(contents, embedding_model):
 
 
 
+# How chunk vectors are obtained at ingestion:
+# - reembed: embed every chunk text again after splitting (one more embedding call per chunk)
+# - sentence_mean: average the sentence embeddings SemanticChunker computed to find breakpoints
+CHUNK_VECTOR_STRATEGIES = ("reembed", "sentence_mean")
+
+
+def _mean_vector(vectors: list) -> List[float]:
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm > 0 else mean).tolist()
+
+
+class VectorSemanticChunker(SemanticChunker):
+    """
+    SemanticChunker that also returns a vector for each chunk: the normalized mean of the
+    embeddings of its sentences (with their buffer), which the chunker already computed
+    to find the breakpoints. Chunks are the same as SemanticChunker.split_text.
+    """
+
+    def split_text_with_vectors(self, text: str) -> List[Tuple[str, Optional[List[float]]]]:
+        single_sentences_list = re.split(self.sentence_split_regex, text)
+        # Too few sentences to compute breakpoints, nothing was embedded
+        if len(single_sentences_list) == 1 or (
+                self.breakpoint_threshold_type == "gradient" and len(single_sentences_list) == 2):
+            return [(sentence, None) for sentence in single_sentences_list]
+
+        distances, sentences = self._calculate_sentence_distances(single_sentences_list)
+        if self.number_of_chunks is not None:
+            breakpoint_distance_threshold = self._threshold_from_clusters(distances)
+            breakpoint_array = distances
+        else:
+            breakpoint_distance_threshold, breakpoint_array = self._calculate_breakpoint_threshold(distances)
+
+        indices_above_thresh = [i for i, x in enumerate(breakpoint_array) if x > breakpoint_distance_threshold]
+
+        chunks = []
+        start_index = 0
+        for index in indices_above_thresh:
+            group = sentences[start_index:index + 1]
+            combined_text = " ".join([d["sentence"] for d in group])
+            if self.min_chunk_size is not None and len(combined_text) < self.min_chunk_size:
+                continue
+            chunks.append((combined_text, _mean_vector([d["combined_sentence_embedding"] for d in group])))
+            start_index = index + 1
+
+        if start_index < len(sentences):
+            group = sentences[start_index:]
+            combined_text = " ".join([d["sentence"] for d in group])
+            chunks.append((combined_text, _mean_vector([d["combined_sentence_embedding"] for d in group])))
+        return chunks
+
+
+def split_docs_semantic_with_vectors(contents, embedding_model) -> Tuple[List[Document], List[Optional[List[float]]]]:
+    """
+    Same chunks as split_docs_semantic, with a vector for each chunk derived from the sentence
+    embeddings. The vector is None when the chunker embedded nothing (single sentence documents).
+    """
+    text_splitter = VectorSemanticChunker(embedding_model)
+    split_documents = []
+    vectors = []
+    for content in contents:
+        try:
+            page_content = content['page_content']
+            if page_content:
+                metadata = {'title': content['title'], 'source': content['link']}
+                for chunk, vector in text_splitter.split_text_with_vectors(page_content):
+                    split_documents.append(Document(page_content=chunk, metadata=dict(metadata)))
+                    vectors.append(vector)
+        except Exception as e:
+            print(f"Error processing content for {content['link']}: {e}")
+
+    return split_documents, vectors
+
+
+def compare_chunk_vectors(documents: list, vectors: list, embedding_model, sample_size: int = 50) -> dict:
+    """
+    Quality check of derived chunk vectors: embed a sample of the chunks directly and report
+    the cosine similarity between both vectors, and how often the derived vector ranks its own
+    chunk first among the sample (retrieval agreement).
+    """
+    pairs = [(doc, vector) for doc, vector in zip(documents, vectors) if vector is not None][:sample_size]
+    if not pairs:
+        return {}
+    derived = np.asarray([vector for _, vector in pairs], dtype=np.float32)
+    direct = np.asarray(embedding_model.embed_documents([doc.page_content for doc, _ in pairs]), dtype=np.float32)
+    derived /= np.linalg.norm(derived, axis=1, keepdims=True) + 1e-12
+    direct /= np.linalg.norm(direct, axis=1, keepdims=True) + 1e-12
+    similarities = np.sum(derived * direct, axis=1)
+    agreement = np.mean(np.argmax(derived @ direct.T, axis=1) == np.arange(len(pairs)))
+    return {
+        'sample_size': len(pairs),
+        'mean_similarity': float(np.mean(similarities)),
+        'min_similarity': float(np.min(similarities)),
+        'retrieval_agreement': float(agreement),
+    }
+
+
 @traceable(run_type="embedding")
 def vectorize(split_documents, embedding_model):
-    
+    from langchain_community.vectorstores import FAISS
+
     # Create vector store
     vector_store = None
     batch_size = 250  # Slightly less than 256 to be safe
@@ -100,52 +230,286 @@ def vectorize(split_documents, embedding_model):
     return vector_store
 
 
+def _upsert_with_retries(index, vectors: list, namespace, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        try:
+            return index.upsert(vectors=vectors, namespace=namespace)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            # Exponential backoff with jitter, so parallel workers do not retry in lockstep
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            print(f"Upsert of {len(vectors)} vectors failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def add_embeddings(vector_store, documents: list, embeddings: list, ids: list = None, batch_size: int = 32,
+                   retries: int = 3, backoff: float = 1.0) -> list:
+    ids = ids or [str(uuid.uuid4()) for _ in documents]
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+
+    if hasattr(vector_store, 'add_embeddings'):
+        # In-process stores such as FAISS accept precomputed embeddings directly
+        return vector_store.add_embeddings(list(zip(texts, embeddings)), metadatas, ids=ids)
+
+    # Pinecone: upsert the vectors the same way PineconeVectorStore.add_texts does
+    text_key = getattr(vector_store, '_text_key', 'text')
+    namespace = getattr(vector_store, '_namespace', None)
+    vectors = [
+        (vector_id, list(embedding), {**metadata, text_key: text})
+        for vector_id, embedding, metadata, text in zip(ids, embeddings, metadatas, texts)
+    ]
+    for i in range(0, len(vectors), batch_size):
+        _upsert_with_retries(vector_store.index, vectors[i:i+batch_size], namespace, retries, backoff)
+    return ids
+
+
+@lru_cache(maxsize=None)
+def _load_prompt(path: str):
+    # Templates are read and parsed once per process
+    return load_prompt(path)
+
 def get_rag_prompt(question: str, context: str) -> list:
-    system_prompt = SystemMessage(load_prompt("prompts/rag_sys.yaml").format())
-    human_prompt = HumanMessage(load_prompt("prompts/rag.yaml").format(question=question, context=context))
+    system_prompt = SystemMessage(_load_prompt("prompts/rag_sys.yaml").format())
+    human_prompt = HumanMessage(_load_prompt("prompts/rag.yaml").format(question=question, context=context))
 
     return [system_prompt, human_prompt]
 
 def format_docs(docs: list) -> str:
     formatted_docs = []
     for d in docs:
-        content = d.page_content
+        content = ' '.join(d.page_content.split())
         title = d.metadata['title']
         source = d.metadata['source']
-        doc = f"""
-        <document>
-            <content>{content}</content>
-            <title>{title}</title>
-            <link>{source}</link>
-        </document>
-        """
-        formatted_docs.append(doc)
-    docs_as_xml = f"<documents>\n{''.join(formatted_docs)}</documents>"
+        formatted_docs.append(f"<document><title>{title}</title><link>{source}</link><content>{content}</content></document>")
+    docs_as_xml = "<documents>\n" + "\n".join(formatted_docs) + "\n</documents>"
     return docs_as_xml
-        
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str = None):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except (KeyError, TypeError, ValueError):
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=1)
+def _warn_token_estimate():
+    print("tiktoken is not installed: context token budgets are estimated at 4 characters per token "
+          "(pip install tiktoken to count the tokens of the model)")
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    if tiktoken is None:
+        # About 4 characters per token for English text
+        _warn_token_estimate()
+        return len(text) // 4 + 1
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def pack_docs(docs: list, max_tokens: int, model: str = None) -> list:
+    """
+    Select documents, in relevance order, until `max_tokens` context tokens are used. Documents
+    that repeat one already selected (same normalized text, or contained in it) are dropped, and
+    a document that doesn't fit is skipped so smaller, less relevant ones can still fill the budget.
+    The most relevant document is truncated to the budget rather than dropped.
+    """
+    packed = []
+    kept_texts = []
+    used = 0
+    for doc in docs:
+        text = ' '.join(doc.page_content.lower().split())
+        if not text or any(text in kept for kept in kept_texts):
+            continue
+        tokens = count_tokens(format_docs([doc]), model)
+        if used + tokens > max_tokens:
+            if packed:
+                continue
+            # Keep a prefix of the most relevant document, in proportion to the budget left for its content
+            overhead = count_tokens(format_docs([Document(page_content='', metadata=doc.metadata)]), model)
+            content_tokens = max(tokens - overhead, 1)
+            doc = Document(page_content=doc.page_content[:len(doc.page_content) * max(max_tokens - overhead, 0) // content_tokens],
+                           metadata=doc.metadata)
+            tokens = max_tokens
+        packed.append(doc)
+        kept_texts.append(text)
+        used += tokens
+    return packed
+
+
 
 def get_similar_docs(search_query: str, vectorstore, top_k: int = 10, callbacks: list = []) -> list:
     return vectorstore.similarity_search(search_query, k=top_k)
 
+def _token_model(chat_llm: BaseChatModel) -> str:
+    return getattr(chat_llm, 'model_name', None) or getattr(chat_llm, 'model', None)
+
 @traceable(run_type="retriever")    
-def build_rag_prompt(question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = []) -> list:
+def build_rag_prompt(question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = [],
+                     context_tokens: int = None, token_model: str = None) -> list:
     unique_docs = get_similar_docs(search_query, vectorstore, top_k=top_k)
+    if context_tokens:
+        unique_docs = pack_docs(unique_docs, context_tokens, token_model)
     context = format_docs(unique_docs)
     messages = get_rag_prompt(question, context)
     return messages
 
-@traceable(run_type="llm", name="query_rag")
-def query_rag(chat_llm: BaseChatModel, question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = []) -> str:
-    messages = build_rag_prompt(question, search_query, vectorstore, top_k=top_k, callbacks=callbacks)
-    response = chat_llm.invoke(messages, config={"callbacks": callbacks})
-    
-    # Ensure we're returning a string
-    if isinstance(response.content, list):
-        # If it's a list, join the elements into a single string
-        return ' '.join(str(item) for item in response.content)
-    elif isinstance(response.content, str):
-        # If it's already a string, return it as is
-        return response.content
+@traceable(run_type="retriever")
+def build_rag_prompts(queries: list, vectorstore, top_k: int = 10, max_concurrency: int = 8,
+                      context_tokens: int = None, token_model: str = None) -> list:
+    """
+    Build the prompts of (question, search_query) pairs, in order. All search queries are
+    embedded at once with cache.embed_queries (as queries, which some providers embed
+    differently from documents, and cached separately), then the vector store is searched by
+    vector for all queries concurrently.
+    With `context_tokens`, each context is packed into that token budget with pack_docs.
+    """
+    if not queries:
+        return []
+    embeddings = cache.embed_queries(vectorstore.embeddings, [search_query for _, search_query in queries],
+                                     max_concurrency=max_concurrency)
+
+    def build(query, embedding):
+        question, _ = query
+        docs = vectorstore.similarity_search_by_vector(embedding, k=top_k)
+        if context_tokens:
+            docs = pack_docs(docs, context_tokens, token_model)
+        return get_rag_prompt(question, format_docs(docs))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(queries), max_concurrency))) as executor:
+        return list(executor.map(build, queries, embeddings))
+
+
+def _chunk_text(content) -> str:
+    # Streamed chunks are strings, or lists of content blocks for some providers
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(item.get('text', '') if isinstance(item, dict) else str(item) for item in content)
+    return str(content)
+
+
+def invoke_llm(chat_llm: BaseChatModel, messages: list, callbacks: list = [], on_token=None) -> str:
+    """
+    Get the answer of the chat model as a string. With `on_token`, the answer is streamed and
+    `on_token` is called with each piece of text as it arrives (once with the whole answer on
+    a cache hit).
+    """
+    llm_cache = cache.get_llm_cache()
+    key = llm_cache.key(chat_llm, messages) if llm_cache is not None else None
+    if key is not None:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            return cached
+
+    if on_token is not None:
+        parts = []
+        for chunk in chat_llm.stream(messages, config={"callbacks": callbacks}):
+            text = _chunk_text(chunk.content)
+            if text:
+                parts.append(text)
+                on_token(text)
+        content = ''.join(parts)
     else:
-        # If it's neither a list nor a string, convert it to a string
-        return str(response.content)
+        response = chat_llm.invoke(messages, config={"callbacks": callbacks})
+
+        # Ensure we're returning a string
+        if isinstance(response.content, list):
+            # If it's a list, join the elements into a single string
+            content = ' '.join(str(item) for item in response.content)
+        elif isinstance(response.content, str):
+            # If it's already a string, return it as is
+            content = response.content
+        else:
+            # If it's neither a list nor a string, convert it to a string
+            content = str(response.content)
+
+    if key is not None:
+        llm_cache.put(key, content)
+    return content
+
+
+@traceable(run_type="llm", name="query_rag")
+def query_rag(chat_llm: BaseChatModel, question: str, search_query: str, vectorstore, top_k: int = 10, callbacks: list = [],
+              context_tokens: int = None) -> str:
+    messages = build_rag_prompt(question, search_query, vectorstore, top_k=top_k, callbacks=callbacks,
+                                context_tokens=context_tokens, token_model=_token_model(chat_llm))
+    return invoke_llm(chat_llm, messages, callbacks)
+
+
+# One concurrency cap per chat model provider, shared by every batch of the process
+_provider_semaphores = {}
+_provider_semaphores_lock = threading.Lock()
+
+
+def _provider_semaphore(chat_llm: BaseChatModel, max_concurrency: int) -> threading.BoundedSemaphore:
+    provider = type(chat_llm).__name__
+    with _provider_semaphores_lock:
+        if provider not in _provider_semaphores:
+            _provider_semaphores[provider] = threading.BoundedSemaphore(max_concurrency)
+        return _provider_semaphores[provider]
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    message = f"{type(error).__name__} {error}".lower()
+    return status == 429 or 'ratelimit' in message or 'rate limit' in message or 'rate_limit' in message
+
+
+def query_rag_batch(chat_llm: BaseChatModel, queries: list, vectorstore, top_k: int = 10, callbacks: list = [],
+                    max_concurrency: int = 4, retries: int = 4, backoff: float = 2.0, context_tokens: int = None,
+                    on_token=None, on_answer=None) -> list:
+    """
+    Answer (question, search_query) pairs concurrently and return the answers in the same order.
+    Prompts are built together with build_rag_prompts. At most `max_concurrency` calls per
+    provider run at once; rate-limited calls are retried with exponential backoff, and a
+    question that still fails gets the error as its answer.
+
+    When streaming, a call is only retried if it failed before its first piece of text: text
+    already streamed can't be taken back, so a stream that breaks midway keeps its partial
+    answer followed by the error, and the returned answer is exactly the streamed text.
+
+    To stream the answers, `on_token(index, text)` is called with each piece of text of the
+    answer to the question at `index`, and `on_answer(index, answer)` once that answer is complete.
+    Both are called from worker threads.
+    """
+    semaphore = _provider_semaphore(chat_llm, max_concurrency)
+    prompts = build_rag_prompts(queries, vectorstore, top_k=top_k, context_tokens=context_tokens,
+                                token_model=_token_model(chat_llm))
+
+    @traceable(run_type="llm", name="query_rag")
+    def answer(index, query, messages):
+        question, _ = query
+        streamed = []
+
+        def stream(text):
+            streamed.append(text)
+            on_token(index, text)
+
+        for attempt in range(retries + 1):
+            try:
+                with semaphore:
+                    return invoke_llm(chat_llm, messages, callbacks, on_token=stream if on_token is not None else None)
+            except Exception as e:
+                if attempt == retries or not _is_rate_limited(e) or streamed:
+                    print(f"Error answering '{question}': {e}")
+                    error = f"Error: {e}" if not streamed else f"\n\nError: {e}"
+                    if on_token is not None:
+                        stream(error)
+                    return ''.join(streamed) if on_token is not None else error
+                delay = backoff * 2 ** attempt * (1 + random.random())
+                print(f"Rate limited answering '{question}', retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def answer_and_notify(index, query, messages):
+        response = answer(index, query, messages)
+        if on_answer is not None:
+            on_answer(index, response)
+        return response
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(queries), max_concurrency))) as executor:
+        return list(executor.map(answer_and_notify, range(len(queries)), queries, prompts))
@@ -1,33 +1,30 @@
 # Standard library imports
+import hashlib
 import os
-import time
 import random
-from typing import List, Dict
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Dict, Tuple
 
 # Third-party library imports
 import click  # Command line interface creation
 import dotenv  # Environment variable management
 import pyperclip  # Clipboard operations
 from rich.console import Console  # Enhanced console output
-from rich.progress import Progress  # Progress bar functionality
-from selenium import webdriver  # Web browser automation
-from selenium.webdriver.chrome.options import Options  # Chrome-specific options
-from selenium.common.exceptions import WebDriverException  # Selenium exception handling
-from webdriver_manager.chrome import ChromeDriverManager  # Chrome driver management
-from selenium.webdriver.chrome.service import Service  # Chrome service management
-from pinecone import Pinecone, ServerlessSpec  # Vector database operations
-from langchain.callbacks import LangChainTracer  # LangChain tracing
-from langchain_pinecone import PineconeVectorStore  # Pinecone vector store integration
-from langsmith import Client  # LangSmith client for LangChain
 
 # Local module imports
 import rag as wr  # Custom RAG (Retrieval-Augmented Generation) module
 import web_crawler as wc  # Custom web crawling module
+import fetch_engine as fe  # Shared asyncio HTTP fetch engine
+import cache  # Persistent on-disk caches
+import dedup  # Cross-query deduplication of sources
+import pipeline  # Streaming staged ingestion pipeline
+import extraction  # Process-pool text extraction
+import vector_stores as vs  # Pinecone and local vector store backends
+import checkpoints  # Ingestion checkpoints for crash-resume
 import models as md  # Custom model management module
-import nlp_rag as nr  # Custom NLP RAG module
-
-# Additional vector store option (currently unused)
-from langchain_community.vectorstores import FAISS
 
 console = Console()
 dotenv.load_dotenv()
@@ -35,18 +32,25 @@ dotenv.load_dotenv()
 # Define verbose as a global variable
 verbose = False
 
+@lru_cache(maxsize=1)
+def get_chromedriver_path() -> str:
+    """
+    Resolve (and download if needed) the chromedriver binary once per process.
+    """
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
 def get_selenium_driver():
     """
     Set up and return a Selenium WebDriver with Chrome options.
     Includes anti-detection measures and random user agent selection.
     """
+    # Selenium is only imported when a page needs a browser
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
     from selenium.common.exceptions import WebDriverException
-    import random
-    from webdriver_manager.chrome import ChromeDriverManager
     from selenium.webdriver.chrome.service import Service
-    
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-gpu")
@@ -67,7 +71,7 @@ def get_selenium_driver():
     chrome_options.add_experimental_option('useAutomationExtension', False)
 
     try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=chrome_options)
         # Overwrite the navigator.webdriver property to avoid detection
         driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
             "source": """
@@ -82,43 +86,59 @@ def get_selenium_driver():
 # Set up LangChain callbacks if API key is available
 callbacks = []
 if os.getenv("LANGCHAIN_API_KEY"):
+    from langchain.callbacks import LangChainTracer  # LangChain tracing
+    from langsmith import Client  # LangSmith client for LangChain
     callbacks.append(
         LangChainTracer(client=Client())
     )
 
-def add_to_vector_store(contents, vector_store, embedding_model):
-    """
-    Split documents and add them to the vector store in batches.
+# Worker threads of each ingestion stage
+INGESTION_WORKERS = {
+    "search": 4,
+    "fetch": 4,
+    "split": 4,
+    "embed": 2,
+    "upsert": 4,
+}
+EMBEDDING_BATCH_SIZE = 250  # Slightly less than 256 to be safe
+EMBEDDING_FLUSH_SECONDS = 1.0  # Embed a partial batch rather than wait for the first pages to fill one
+CHUNK_VECTOR_CHECK_SAMPLE = 50
+
+def extract_info(startup_name: str, vector_store, embedding_model, driver_pool: wc.DriverPool = None,
+                 browser_deadline: float = 30, chunk_vectors: str = "reembed", check_chunk_vectors: bool = False,
+                 upsert_workers: int = INGESTION_WORKERS["upsert"], show_status: bool = True,
+                 checkpoint: checkpoints.RunCheckpoint = None, manifest: checkpoints.SourceManifest = None,
+                 prune: bool = False, budget: fe.DownloadBudget = None) -> int:
     """
-    with console.status(f"[bold green]Splitting documents"):
-        split_documents = wr.split_docs_semantic(contents, embedding_model)
+    Extract information about a startup using predefined search queries.
 
-    with Progress() as progress:
-        task = progress.add_task("[bold green]Adding content to vector store", total=len(split_documents))
-        batch_size = 250  # Slightly less than 256 to be safe
-        for i in range(0, len(split_documents), batch_size):
-            batch = split_documents[i:i+batch_size]
-            vector_store.add_documents(batch)
-            progress.update(task, advance=len(batch))
+    Ingestion is a streaming pipeline (search -> fetch and extract -> split -> embed -> upsert)
+    connected by bounded queues, so the first pages are split, embedded and stored while the
+    last ones are still being fetched. Sources already fetched for another query and documents
+    that nearly duplicate one already kept are skipped.
 
-    return vector_store
+    Embedded batches are upserted by `upsert_workers` threads in parallel; the bounded queue in
+    front of them caps the batches in flight, and failed upserts are retried with backoff.
 
-def get_info(query: str, max_pages: int = 10, domain: str = None):
-    """
-    Search for information based on the given query and extract content from web pages.
-    """
-    with console.status(f"[bold green]Searching info for {query}"):
-        sources = wc.get_sources(query, max_pages=max_pages, domain=domain)
-        contents = wc.get_links_contents(sources, get_selenium_driver, use_browser=True)
-        contents = [content for content in contents if content.get('page_content')]
-        if verbose:
-            console.log(f"Managed to extract content from {len(contents)} sources for {query}")
+    With the "sentence_mean" chunk-vector strategy, chunk vectors are derived from the sentence
+    embeddings computed by the semantic chunker and only chunks without one are embedded.
 
-    return contents
+    Set `show_status` to False when several startups are researched at once: the console can
+    only display one live status.
 
-def extract_info(startup_name: str, vector_store, embedding_model):
-    """
-    Extract information about a startup using predefined search queries.
+    With a `checkpoint`, every completed unit of work (search results, fetched contents, chunks
+    and their vectors, upserted chunks) is recorded, and work already recorded by an interrupted
+    run is reused instead of done again. Returns the number of units of work that failed (and
+    were dropped); when none did, the checkpoint is marked complete.
+
+    With a `manifest`, sources whose content did not change since they were stored are skipped,
+    only chunks that are not stored yet are embedded and upserted, and chunks that disappeared
+    from a changed source are deleted once every new chunk was upserted (so a changed source
+    is never missing from the index). With `prune`, the chunks of stored sources that no
+    search returned anymore are deleted too, if every stage succeeded and every search
+    returned results.
+
+    Pages are downloaded under the `budget` of the research (the fetch engine budget by default).
     """
     search_queries = [
         "startup",
@@ -133,12 +153,172 @@ def extract_info(startup_name: str, vector_store, embedding_model):
         "funding history"
     ]
     
-    contents = []
-    for query in search_queries:
-        contents += get_info(f"{startup_name} {query}")
-
-    # Add all contents to the vector store
-    add_to_vector_store(contents, vector_store, embedding_model)
+    deduplicator = dedup.Deduplicator()
+    stored = 0
+    stored_lock = threading.Lock()
+    derived_sample = []
+    seen_links = set()
+    empty_searches = 0
+    unchanged = 0
+    stale_ids = []
+    if checkpoint is not None:
+        checkpoint.mark_started()
+
+    def search(query):
+        nonlocal empty_searches
+        sources = checkpoint.get_search(query) if checkpoint is not None else None
+        if sources is None:
+            # A failed search raises (counted as a stage error) and is not checkpointed, so a
+            # resumed run tries it again
+            sources = wc.get_sources(f"{startup_name} {query}")
+            if checkpoint is not None:
+                checkpoint.put_search(query, sources)
+        with stored_lock:
+            seen_links.update(source['link'] for source in sources)
+            if not sources:
+                empty_searches += 1
+        return [deduplicator.filter_sources(sources)]
+
+    def fetch(sources):
+        done = checkpoint.get_contents([source['link'] for source in sources]) if checkpoint is not None else {}
+        todo = [source for source in sources if source['link'] not in done]
+        fetched = wc.get_links_contents(todo, driver_pool, use_browser=driver_pool is not None,
+                                        browser_deadline=browser_deadline, budget=budget) if todo else []
+        fetched = [content for content in fetched if content and content.get('page_content')]
+        if checkpoint is not None:
+            # Pages that could not be fetched are not recorded, a resumed run tries them again
+            checkpoint.put_contents(fetched)
+        contents = [done[source['link']] for source in sources if source['link'] in done] + fetched
+        return deduplicator.filter_contents(contents)
+
+    def split(content):
+        nonlocal unchanged
+        if checkpoint is not None:
+            chunks = checkpoint.get_chunks(content['link'])
+            if chunks is not None:
+                # Chunks already upserted by an interrupted run are not stored again
+                return [(chunk_id, doc, vector) for chunk_id, doc, vector, upserted in chunks if not upserted]
+
+        content_hash = hashlib.sha256(content['page_content'].encode('utf-8')).hexdigest()
+        if manifest is not None and manifest.get_hash(content['link']) == content_hash:
+            with stored_lock:
+                unchanged += 1
+            return []
+
+        if chunk_vectors == "sentence_mean":
+            documents, vectors = wr.split_docs_semantic_with_vectors([content], embedding_model)
+            if check_chunk_vectors:
+                with stored_lock:
+                    room = CHUNK_VECTOR_CHECK_SAMPLE - len(derived_sample)
+                    derived_sample.extend([pair for pair in zip(documents, vectors) if pair[1] is not None][:room])
+        else:
+            documents = wr.split_docs_semantic([content], embedding_model)
+            vectors = [None] * len(documents)
+        # Deterministic ids: an unchanged chunk keeps its id, so it is never stored twice.
+        # Repeated chunks of a page (boilerplate) are told apart by their occurrence number
+        link_hash = hashlib.sha256(content['link'].encode('utf-8')).hexdigest()[:16]
+        occurrences = {}
+        chunks = []
+        for doc, vector in zip(documents, vectors):
+            text_hash = hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()[:16]
+            occurrence = occurrences[text_hash] = occurrences.get(text_hash, -1) + 1
+            chunk_id = f"{link_hash}-{text_hash}" + (f"-{occurrence}" if occurrence else "")
+            chunks.append((chunk_id, doc, vector))
+        chunk_ids = [chunk_id for chunk_id, _, _ in chunks]
+        if manifest is not None:
+            stored_ids = manifest.get_chunk_ids(content['link'])
+            chunks = [chunk for chunk in chunks if chunk[0] not in stored_ids]
+        # Checkpoint before the manifest, so a crash in between can't lose the new chunks
+        # nor the replaced ones, which are deleted after the new chunks are upserted
+        if checkpoint is not None:
+            checkpoint.put_chunks(content['link'], chunks)
+        if manifest is not None:
+            stale = sorted(manifest.get_chunk_ids(content['link']) - set(chunk_ids))
+            if stale:
+                if checkpoint is not None:
+                    checkpoint.put_stale(stale)
+                with stored_lock:
+                    stale_ids.extend(stale)
+            manifest.put_source(content['link'], content_hash, chunk_ids)
+        return chunks
+
+    def embed(chunks):
+        ids = [chunk_id for chunk_id, _, _ in chunks]
+        documents = [doc for _, doc, _ in chunks]
+        embeddings = [vector for _, _, vector in chunks]
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            for i, vector in zip(missing, embedding_model.embed_documents([documents[i].page_content for i in missing])):
+                embeddings[i] = vector
+            if checkpoint is not None:
+                checkpoint.put_vectors([ids[i] for i in missing], [embeddings[i] for i in missing])
+        return [(ids, documents, embeddings)]
+
+    def upsert(batch):
+        nonlocal stored
+        ids, documents, embeddings = batch
+        wr.add_embeddings(vector_store, documents, embeddings, ids=ids)
+        if checkpoint is not None:
+            checkpoint.mark_upserted(ids)
+        with stored_lock:
+            stored += len(documents)
+            if status is not None:
+                status.update(f"[bold green]Researching {startup_name}: {stored} chunks added to vector store")
+        return [len(documents)]
+
+    ingestion = (pipeline.Pipeline()
+                 .add_stage("search", search, workers=INGESTION_WORKERS["search"])
+                 .add_stage("fetch", fetch, workers=INGESTION_WORKERS["fetch"])
+                 .add_stage("split", split, workers=INGESTION_WORKERS["split"])
+                 .add_stage("embed", embed, workers=INGESTION_WORKERS["embed"], batch_size=EMBEDDING_BATCH_SIZE,
+                            flush_seconds=EMBEDDING_FLUSH_SECONDS)
+                 .add_stage("upsert", upsert, workers=upsert_workers))
+
+    with console.status(f"[bold green]Researching {startup_name}") if show_status else nullcontext() as status:
+        ingestion.run(search_queries)
+
+    if verbose_global:
+        for stats in ingestion.stats:
+            console.log(f"Stage {stats.name}: {stats.items_in} in, {stats.items_out} out, "
+                        f"{stats.errors} errors, {stats.busy_seconds:.1f}s busy")
+        console.log(f"Skipped {deduplicator.skipped_urls} repeated URLs and "
+                    f"{deduplicator.skipped_documents} duplicate documents")
+        if isinstance(embedding_model, cache.CachedEmbeddings):
+            console.log(f"Embedding cache: {embedding_model.hits} hits, {embedding_model.misses} misses")
+
+    if derived_sample:
+        documents, vectors = zip(*derived_sample)
+        quality = wr.compare_chunk_vectors(list(documents), list(vectors), embedding_model)
+        console.log(f"Chunk vectors ({chunk_vectors}) vs re-embedding on {quality['sample_size']} chunks: "
+                    f"mean similarity {quality['mean_similarity']:.3f}, min {quality['min_similarity']:.3f}, "
+                    f"retrieval agreement {quality['retrieval_agreement']:.0%}")
+
+    errors = sum(stats.errors for stats in ingestion.stats)
+    succeeded = errors == 0
+    if succeeded:
+        # Every new chunk is stored: delete the chunks they replace (including those of an
+        # interrupted run)
+        stale = sorted(set(stale_ids) | set(checkpoint.get_stale() if checkpoint is not None else ()))
+        if stale:
+            vs.delete_chunks(vector_store, stale)
+            if checkpoint is not None:
+                checkpoint.clear_stale(stale)
+        stale_ids = stale
+    vanished = []
+    # Only prune when every search returned results: a source missing from an empty result list
+    # may not have vanished at all
+    if prune and succeeded and empty_searches == 0 and manifest is not None:
+        vanished = sorted(manifest.links() - seen_links)
+        vs.delete_chunks(vector_store, manifest.remove_sources(vanished))
+    if verbose_global and manifest is not None:
+        console.log(f"Refresh: {unchanged} unchanged sources skipped, {len(stale_ids)} changed chunks "
+                    f"and {len(vanished)} vanished sources deleted")
+    if checkpoint is not None:
+        if succeeded:
+            checkpoint.mark_complete()
+        else:
+            console.log(f"Ingestion of {startup_name} had errors, the next run will resume it")
+    return errors
 
 def write_results_to_markdown(file_path: str, startup_name: str, results: list):
     """
@@ -153,71 +333,85 @@ def write_results_to_markdown(file_path: str, startup_name: str, results: list):
             f.write(f"{result['response']}\n\n")
             f.write("---\n\n")  # Horizontal line after each answer
 
-# Define verbose_global as a global variable
-verbose_global = False
-
-@click.command()
-@click.argument('startup_name', required=True)
-@click.option('-m', '--model_name', default='groq', help='The name of the model to use.')
-@click.option('-o', '--output_file', help='The name of the file to write the results to.')
-@click.option('-e', '--embedding_model_name', default='openai', help='The name of the embedding model to use.')
-@click.option('-v', '--verbose', is_flag=True, default=False, help='Enable verbose output.')
-@click.option('-c', '--copy_to_clipboard', is_flag=True, default=False, help='Copy the results to clipboard.')
-@click.option('-f', '--force_refresh', is_flag=True, default=False, help='Force refresh of information even if index exists.')
-def main(startup_name, model_name, output_file, embedding_model_name, verbose, copy_to_clipboard, force_refresh):
-    global verbose_global
-    verbose_global = verbose
-
+class ReportWriter:
     """
-    Main function to research a startup and generate a report.
+    Write the markdown report (same layout as write_results_to_markdown) while the answers
+    stream in. Questions are answered concurrently, but sections are written in question order:
+    the text of the section at the head goes straight to the file (and to the console with
+    `echo`), the text of later sections is buffered until every section before them is complete.
+    The file is flushed to disk after each section, so an interrupted run leaves a partial report.
+    A `warning` (e.g. about a partial index) is written under the title.
     """
-    # Set up index name and output file
-    index_name = startup_name.lower().replace(' ', '-')
-    output_file = f"{index_name}.md" if output_file is None else output_file
 
-    # Initialize language model and embedding model
-    llm = md.get_model(model_name)
-    embedding_model = md.get_embedding_model(embedding_model_name)   
-
-    # Set up Pinecone vector database
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
-
-    # Modify the logic for creating/using the index
-    should_look_info = True
-    if index_name not in existing_indexes or force_refresh:
-        if index_name in existing_indexes and force_refresh:
-            if verbose_global:
-                print(f"Force refresh requested. Deleting existing index '{index_name}'.")
-            pc.delete_index(index_name)
-
-        with console.status(f"[bold green]Creating index {index_name} in Pinecone"):
-            sample_text = "This is a sample text to check embedding dimensions."
-            vector = embedding_model.embed_query(sample_text)
-            dimensions = len(vector)
-
-            pc.create_index(
-                name=index_name,
-                dimension=dimensions,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-            )
-            while not pc.describe_index(index_name).status["ready"]:
-                time.sleep(1)
-    else:
-        should_look_info = False
-        if verbose_global:
-            print(f"Using existing index '{index_name}'. Use --force_refresh to update information.")
+    def __init__(self, file_path: str, startup_name: str, questions: List[str], echo: bool = True,
+                 warning: str = None):
+        self.questions = questions
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._head = 0
+        self._buffers: Dict[int, List[str]] = {index: [] for index in range(len(questions))}
+        self._finished = set()
+        self._file = open(file_path, 'w', encoding='utf-8')
+        self._file.write(f"# Research Results for {startup_name}\n\n")
+        if warning:
+            self._file.write(f"> **Warning:** {warning}\n\n")
+        self._file.write("---\n\n")  # Horizontal line at the start
+        self._start_section()
+
+    def _write(self, text: str):
+        self._file.write(text)
+        if self.echo:
+            print(text, end='', flush=True)
+
+    def _start_section(self):
+        if self._head >= len(self.questions):
+            return
+        question = self.questions[self._head]
+        self._file.write(f"## {question}\n\n")
+        if self.echo:
+            print(f"\nQuestion: {question}\nAnswer: ", end='', flush=True)
+        for text in self._buffers.pop(self._head):
+            self._write(text)
+
+    def add_token(self, index: int, text: str):
+        with self._lock:
+            if index == self._head:
+                self._write(text)
+            else:
+                self._buffers[index].append(text)
+
+    def finish(self, index: int, answer: str = None):
+        with self._lock:
+            self._finished.add(index)
+            while self._head in self._finished:
+                self._file.write("\n\n---\n\n")  # Horizontal line after each answer
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                if self.echo:
+                    print(flush=True)
+                self._head += 1
+                self._start_section()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> 'ReportWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-    index = pc.Index(index_name)
-    vector_store = PineconeVectorStore(index=index, embedding=embedding_model)
+# Define verbose_global as a global variable
+verbose_global = False
 
-    # Extract information if needed
-    if should_look_info:
-        extract_info(startup_name, vector_store, embedding_model)
+def get_index_name(startup_name: str) -> str:
+    return startup_name.lower().replace(' ', '-')
 
-    # Define queries for startup research
-    queries = [
+def get_research_queries(startup_name: str) -> list:
+    """
+    The (question, search query) pairs answered in every report.
+    """
+    return [
         (f"Tell me about {startup_name}", startup_name),
         (f"Who is {startup_name} founding team", f"{startup_name} founders"),
         (f"What are the main products and/or services of {startup_name}?", f"{startup_name} products"),
@@ -227,23 +421,220 @@ def main(startup_name, model_name, output_file, embedding_model_name, verbose, c
         (f"Who are {startup_name} competitors", f"{startup_name} competitors")
     ]
 
-    # Process queries and generate results
-    results = []
-    for question in queries:
-        search_query = f"{startup_name} {question[1]}"
-        response = wr.query_rag(llm, question[0], search_query, vector_store, top_k=20)
-        
-        print(f"\nQuestion: {question[0]}")
-        print(f"Answer: {response}")
+def runtime_options(command):
+    """
+    Click options of the research runtime, shared by the single startup and batch commands.
+    """
+    options = [
+        click.option('-m', '--model_name', default='groq', help='The name of the model to use.'),
+        click.option('-e', '--embedding_model_name', default='openai', help='The name of the embedding model to use.'),
+        click.option('-v', '--verbose', is_flag=True, default=False, help='Enable verbose output.'),
+        click.option('-f', '--force_refresh', is_flag=True, default=False, help='Force refresh of information even if index exists.'),
+        click.option('--refresh', is_flag=True, default=False,
+                     help='Incrementally refresh an existing index: only store changed chunks and delete vanished sources.'),
+        click.option('--browsers', default=2, show_default=True, help='Maximum number of headless browsers used for the fallback fetch.'),
+        click.option('--browser_max_pages', default=20, show_default=True, help='Recycle a browser after it has served this many pages.'),
+        click.option('--browser_deadline', default=30.0, show_default=True, help='Seconds allowed for all browser fetches of one search.'),
+        click.option('--max_connections', default=100, show_default=True, help='Maximum number of HTTP fetches in flight.'),
+        click.option('--max_per_host', default=8, show_default=True, help='Maximum number of HTTP fetches in flight per host.'),
+        click.option('--cache_dir', default=cache.DEFAULT_CACHE_DIR, show_default=True, help='Directory of the on-disk caches.'),
+        click.option('--page_ttl_hours', default=168.0, show_default=True, help='Hours a cached page is used before it is revalidated.'),
+        click.option('--page_cache_mb', default=1024, show_default=True, help='Maximum size of the page cache in megabytes.'),
+        click.option('--search_ttl_hours', default=24.0, show_default=True, help='Hours a cached search result is reused.'),
+        click.option('--embedding_cache_mb', default=2048, show_default=True, help='Maximum size of the embedding cache in megabytes, 0 disables it.'),
+        click.option('--pdf_max_mb', default=50, show_default=True, help='Skip PDFs larger than this many megabytes.'),
+        click.option('--page_max_mb', default=5, show_default=True, help='Skip other pages larger than this many megabytes.'),
+        click.option('--run_max_mb', type=int, default=None, help='Stop downloading pages for a startup once this many megabytes were fetched for it.'),
+        click.option('--pdf_max_pages', default=100, show_default=True, help='Only extract the first pages of a PDF.'),
+        click.option('--extract_workers', type=int, default=None, help='Processes used for HTML/PDF extraction. Defaults to the number of cores.'),
+        click.option('--vector_store', 'vector_store_backend', type=click.Choice(vs.VECTOR_STORE_BACKENDS), default='pinecone',
+                     show_default=True, help='Store the research index in Pinecone or locally under the cache directory.'),
+        click.option('--pinecone_index', default=None,
+                     help='Store every startup as a namespace of this shared Pinecone index instead of one index per startup.'),
+        click.option('--upsert_workers', default=INGESTION_WORKERS["upsert"], show_default=True, help='Parallel vector store upserts.'),
+        click.option('--llm_concurrency', default=4, show_default=True, help='Maximum number of questions answered at once per model provider.'),
+        click.option('--context_tokens', default=6000, show_default=True,
+                     help='Token budget of the retrieved context of each question, 0 for no limit.'),
+        click.option('--llm_cache', is_flag=True, default=False,
+                     help='Reuse the answers of identical prompts (same model, question and context) from earlier runs.'),
+        click.option('--llm_cache_ttl_hours', default=168.0, show_default=True, help='Hours a cached answer is reused.'),
+        click.option('--llm_cache_mb', default=256, show_default=True, help='Maximum size of the answer cache in megabytes.'),
+        click.option('--chunk_vectors', type=click.Choice(wr.CHUNK_VECTOR_STRATEGIES), default='reembed', show_default=True,
+                     help='Embed chunks again after splitting, or derive their vectors from the sentence embeddings of the chunker.'),
+        click.option('--check_chunk_vectors', is_flag=True, default=False, help='Compare derived chunk vectors with re-embedding on a sample of chunks.'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
 
-        results.append({
-            "question": question[0],
-            "response": response
-        })
+@dataclass
+class Runtime:
+    """
+    Everything a research reuses across startups: models, browser pool and settings. The fetch
+    engine, extraction process pool and caches are process-wide and configured with it.
+    """
+    llm: object
+    embedding_model: object
+    driver_pool: wc.DriverPool
+    settings: Dict = field(default_factory=dict)
+
+    def close(self):
+        self.driver_pool.close()
+
+    def download_budget(self) -> fe.DownloadBudget:
+        """A new download budget for the research of one startup (--run_max_mb)."""
+        run_max_mb = self.settings.get('run_max_mb')
+        return fe.DownloadBudget(run_max_mb * 1024 * 1024 if run_max_mb else None)
 
-    # Write results to file if specified
-    if output_file:
-        write_results_to_markdown(output_file, startup_name, results)
+def create_runtime(**settings) -> Runtime:
+    """
+    Configure the process-wide fetch engine, extraction pool and caches, and create the models
+    and the browser pool (browsers only start when a page needs one).
+    """
+    global verbose_global
+    verbose_global = settings['verbose']
+
+    fe.configure(max_connections=settings['max_connections'], max_per_host=settings['max_per_host'],
+                 pdf_max_bytes=settings['pdf_max_mb'] * 1024 * 1024, page_max_bytes=settings['page_max_mb'] * 1024 * 1024)
+    extraction.configure(max_workers=settings['extract_workers'], pdf_max_pages=settings['pdf_max_pages'])
+    # Refreshes revalidate every cached page instead of downloading it again
+    cache.configure_page_cache(cache_dir=settings['cache_dir'],
+                               ttl=0 if settings['force_refresh'] or settings['refresh'] else settings['page_ttl_hours'] * 3600,
+                               max_bytes=settings['page_cache_mb'] * 1024 * 1024)
+    cache.configure_search_cache(cache_dir=settings['cache_dir'], ttl=settings['search_ttl_hours'] * 3600)
+    if settings['llm_cache']:
+        cache.configure_llm_cache(cache_dir=settings['cache_dir'], ttl=settings['llm_cache_ttl_hours'] * 3600,
+                                  max_bytes=settings['llm_cache_mb'] * 1024 * 1024)
+
+    # Initialize language model and embedding model
+    llm = md.get_model(settings['model_name'])
+    embedding_model = md.get_embedding_model(settings['embedding_model_name'],
+                                             cache_dir=settings['cache_dir'] if settings['embedding_cache_mb'] else None,
+                                             cache_max_bytes=settings['embedding_cache_mb'] * 1024 * 1024)
+    driver_pool = wc.DriverPool(get_selenium_driver, size=settings['browsers'], max_pages=settings['browser_max_pages'])
+    return Runtime(llm, embedding_model, driver_pool, settings)
+
+def research_startup(startup_name: str, runtime: Runtime, show_status: bool = True, report_file: str = None,
+                     echo: bool = True, budget: fe.DownloadBudget = None) -> Tuple[list, int]:
+    """
+    Research a startup: fill its index if needed, then answer the research questions.
+    Returns the results in question order, as expected by write_results_to_markdown, and the
+    number of units of ingestion work that failed: with errors, the answers come from a partial
+    index, which the report warns about.
+
+    With `report_file`, answers are streamed into the report as they are generated, and to the
+    console too with `echo`.
+
+    Pages are downloaded under `budget`, a new budget of the runtime by default: pass one to
+    read how much the research downloaded and skipped.
+    """
+    settings = runtime.settings
+    budget = runtime.download_budget() if budget is None else budget
+    index_name = get_index_name(startup_name)
+    status = console.status if show_status else (lambda message: nullcontext())
+
+    run_dir = checkpoints.get_run_dir(settings['cache_dir'], settings['vector_store_backend'], index_name)
+    checkpoint = checkpoints.RunCheckpoint(run_dir)
+    manifest = checkpoints.SourceManifest(run_dir)
+    if settings['force_refresh'] or (settings['refresh'] and checkpoint.complete):
+        # A forced or incremental refresh is a new run, unless the previous refresh was interrupted
+        checkpoint.reset()
+    # An index with no recorded run was built before checkpoints existed, it is not resumed
+    legacy_index = not checkpoint.started
+    # Mark the run started before the vector store may be created: if the run is interrupted
+    # once the store exists, the next run resumes the ingestion instead of answering from an
+    # empty index
+    if not checkpoint.complete:
+        checkpoint.mark_started()
+
+    # Open the vector store, creating it if needed
+    with status(f"[bold green]Opening index {index_name}"):
+        vector_store, should_look_info = vs.open_vector_store(settings['vector_store_backend'], index_name,
+                                                              runtime.embedding_model, cache_dir=settings['cache_dir'],
+                                                              force_refresh=settings['force_refresh'],
+                                                              verbose=verbose_global, shared_index=settings['pinecone_index'])
+    if should_look_info:
+        # A new, empty vector store: nothing recorded for the previous one applies
+        checkpoint.reset(started=True)
+        manifest.reset()
+    elif settings['refresh']:
+        if not manifest.links():
+            # The index was built before the manifest existed: the ids of its chunks are unknown,
+            # so an incremental refresh would store every chunk a second time. Rebuild it instead
+            console.log(f"Index {index_name} has no source manifest, rebuilding it")
+            checkpoint.reset(started=True)
+            with status(f"[bold green]Recreating index {index_name}"):
+                vector_store, _ = vs.open_vector_store(settings['vector_store_backend'], index_name,
+                                                       runtime.embedding_model, cache_dir=settings['cache_dir'],
+                                                       force_refresh=True, verbose=verbose_global,
+                                                       shared_index=settings['pinecone_index'])
+        should_look_info = True
+    elif legacy_index:
+        # Only marked started by this run, which has nothing to resume
+        checkpoint.reset()
+    elif checkpoint.started and not checkpoint.complete:
+        should_look_info = True
+        if verbose_global:
+            console.log(f"Resuming the interrupted ingestion of {startup_name}: {checkpoint.counts()}")
+
+    # Extract information if needed
+    ingestion_errors = 0
+    if should_look_info:
+        ingestion_errors = extract_info(startup_name, vector_store, runtime.embedding_model, runtime.driver_pool,
+                                        settings['browser_deadline'], chunk_vectors=settings['chunk_vectors'],
+                                        check_chunk_vectors=settings['check_chunk_vectors'],
+                                        upsert_workers=settings['upsert_workers'], show_status=show_status,
+                                        checkpoint=checkpoint, manifest=manifest, prune=settings['refresh'],
+                                        budget=budget)
+        if budget.skipped:
+            console.log(f"{startup_name}: download budget of {settings['run_max_mb']} MB exhausted, "
+                        f"{budget.skipped} pages skipped")
+
+    # Answer the questions concurrently, results keep the order of the queries
+    queries = get_research_queries(startup_name)
+    search_queries = [(question, f"{startup_name} {search_query}") for question, search_query in queries]
+    warning = None
+    if ingestion_errors:
+        warning = (f"{ingestion_errors} ingestion steps failed, the answers come from a partial index. "
+                   f"Run the research again to resume the ingestion.")
+        console.log(f"{startup_name}: {warning}")
+    if report_file:
+        with ReportWriter(report_file, startup_name, [question for question, _ in queries], echo=echo,
+                          warning=warning) as report:
+            responses = wr.query_rag_batch(runtime.llm, search_queries, vector_store, top_k=20,
+                                           max_concurrency=settings['llm_concurrency'],
+                                           context_tokens=settings['context_tokens'],
+                                           on_token=report.add_token, on_answer=report.finish)
+    else:
+        with status(f"[bold green]Answering {len(queries)} questions about {startup_name}"):
+            responses = wr.query_rag_batch(runtime.llm, search_queries, vector_store, top_k=20,
+                                           max_concurrency=settings['llm_concurrency'],
+                                           context_tokens=settings['context_tokens'])
+    llm_cache = cache.get_llm_cache()
+    if verbose_global and llm_cache is not None:
+        console.log(f"LLM cache: {llm_cache.hits} hits, {llm_cache.misses} misses")
+
+    results = [{"question": question, "response": response} for (question, _), response in zip(queries, responses)]
+    return results, ingestion_errors
+
+@click.command()
+@click.argument('startup_name', required=True)
+@click.option('-o', '--output_file', help='The name of the file to write the results to.')
+@click.option('-c', '--copy_to_clipboard', is_flag=True, default=False, help='Copy the results to clipboard.')
+@runtime_options
+def main(startup_name, output_file, copy_to_clipboard, **settings):
+    """
+    Main function to research a startup and generate a report.
+    """
+    # Set up output file
+    output_file = f"{get_index_name(startup_name)}.md" if output_file is None else output_file
+
+    runtime = create_runtime(**settings)
+    try:
+        # Answers are printed and written to the output file as they stream in
+        research_startup(startup_name, runtime, report_file=output_file)
+    finally:
+        runtime.close()
 
     # Copy results to clipboard if specified
     if copy_to_clipboard:
@@ -251,4 +642,4 @@ def main(startup_name, model_name, output_file, embedding_model_name, verbose, c
             pyperclip.copy(f.read())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,318 @@
+"""
+Vector store backends for the research index of a startup.
+
+Classes:
+- LocalVectorStore:
+    Persistent in-process vector store: vectors in a memory-mapped float32 array, texts and
+    metadata in SQLite. Supports incremental adds, deletes and cosine similarity search.
+
+Functions:
+- open_vector_store(backend: str, index_name: str, embedding_model, cache_dir: str, force_refresh: bool, shared_index: str) -> tuple:
+    Open (creating if needed) the vector store of an index, or of a namespace in a shared
+    Pinecone index, and tell whether it must be filled.
+- delete_chunks(vector_store, ids: list, batch_size: int = 1000) -> None:
+    Delete chunks by id from any vector store, in batches.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.docstore.document import Document
+
+from cache import DEFAULT_CACHE_DIR
+
+VECTOR_STORE_BACKENDS = ("pinecone", "local")
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Store vectors under `path`: `vectors.f32` holds one L2-normalized row per chunk and
+    `index.sqlite` maps each row to its id, text and metadata. Rows are appended, so adding
+    chunks never rewrites the existing ones, and deleted rows are masked out of searches.
+    Scores are cosine similarities, like the Pinecone indexes created by this project.
+
+    :param path: Directory of the store, created if missing.
+    :param embedding: Embeddings used for text queries and `add_texts`.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings):
+        self.path = path
+        self.embedding = embedding
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        dim = self._conn.execute("SELECT value FROM settings WHERE name = 'dim'").fetchone()
+        self.dim: Optional[int] = int(dim[0]) if dim else None
+        self._array: Optional[np.memmap] = None
+        self._size = self._conn.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM chunks").fetchone()[0]
+        self._alive = np.zeros(self._size, dtype=bool)
+        rows = [row for row, in self._conn.execute("SELECT row FROM chunks")]
+        self._alive[rows] = True
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "index.sqlite"))
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def _vectors(self, min_rows: int = 0) -> np.memmap:
+        """Return the memory map of the vectors, growing the file to hold `min_rows`."""
+        if self._array is not None and len(self._array) >= min_rows:
+            return self._array
+        path = os.path.join(self.path, "vectors.f32")
+        rows = os.path.getsize(path) // (self.dim * 4) if os.path.exists(path) else 0
+        if rows < min_rows or rows == 0:
+            rows = max(min_rows, rows * 2, 1024)
+            if self._array is not None:
+                self._array.flush()
+            with open(path, 'ab') as f:
+                f.truncate(rows * self.dim * 4)
+        self._array = np.memmap(path, dtype=np.float32, mode='r+', shape=(rows, self.dim))
+        return self._array
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Add texts with precomputed embeddings (same signature as FAISS.add_embeddings).
+        Adding an id that is already stored replaces it.
+        """
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        ids = ids or [str(uuid.uuid4()) for _ in text_embeddings]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in the same batch")
+        vectors = np.asarray([embedding for _, embedding in text_embeddings], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store dimension {self.dim}")
+            # All or nothing: a failed write is rolled back, so the next one starts from a clean
+            # transaction and the in-memory state only changes once the rows are committed
+            try:
+                if self.dim is None:
+                    self._conn.execute("INSERT INTO settings VALUES ('dim', ?)", (str(vectors.shape[1]),))
+                    self.dim = vectors.shape[1]
+                replaced = self._delete_rows(ids)
+                start = self._size
+                array = self._vectors(start + len(vectors))
+                array[start:start + len(vectors)] = vectors
+                array.flush()
+                self._conn.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    [(start + i, vector_id, text, json.dumps(metadata))
+                     for i, (vector_id, (text, _), metadata) in enumerate(zip(ids, text_embeddings, metadatas))])
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                if self._conn.execute("SELECT 1 FROM settings WHERE name = 'dim'").fetchone() is None:
+                    self.dim = None
+                raise
+            self._alive[replaced] = False
+            self._size = start + len(vectors)
+            self._alive = np.concatenate([self._alive, np.ones(len(vectors), dtype=bool)])
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding.embed_documents(texts)), metadatas, ids)
+
+    def _delete_rows(self, ids: List[str]) -> List[int]:
+        """Delete the rows of `ids` in the current transaction and return them."""
+        rows = []
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            rows += [row for row, in self._conn.execute(
+                f"SELECT row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)]
+        if rows:
+            self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+        return rows
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks by id. The rows stay in the vector file and are no longer searched."""
+        if not ids:
+            return False
+        with self._lock:
+            try:
+                rows = self._delete_rows(list(ids))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._alive[rows] = False
+        return len(rows) > 0
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self._lock:
+            if self.dim is None or self._size == 0:
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1
+            scores = self._vectors()[:self._size] @ query
+            scores[~self._alive[:self._size]] = -np.inf
+            k = min(k, len(self))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows = {row: (text, metadata) for row, text, metadata in self._conn.execute(
+                f"SELECT row, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(top))})",
+                [int(row) for row in top])}
+        return [
+            (Document(page_content=rows[row][0], metadata=json.loads(rows[row][1])), float(scores[row]))
+            for row in top if row in rows
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   path: Optional[str] = None, **kwargs: Any) -> 'LocalVectorStore':
+        store = cls(path or os.path.join(DEFAULT_CACHE_DIR, "vectors", str(uuid.uuid4())), embedding)
+        store.add_texts(texts, metadatas, ids=kwargs.get('ids'))
+        return store
+
+
+# Pinecone clients are imported on first use, runs with the local backend never load them
+def _create_pinecone_index(pc, index_name: str, embedding_model):
+    from pinecone import ServerlessSpec
+
+    sample_text = "This is a sample text to check embedding dimensions."
+    dimensions = len(embedding_model.embed_query(sample_text))
+    pc.create_index(
+        name=index_name,
+        dimension=dimensions,
+        metric="cosine",
+        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+    )
+    while not pc.describe_index(index_name).status["ready"]:
+        time.sleep(1)
+
+
+def _open_pinecone(index_name: str, embedding_model, force_refresh: bool, verbose: bool = False):
+    from pinecone import Pinecone
+    from langchain_pinecone import PineconeVectorStore
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
+
+    needs_ingestion = True
+    if index_name not in existing_indexes or force_refresh:
+        if index_name in existing_indexes and force_refresh:
+            if verbose:
+                print(f"Force refresh requested. Deleting existing index '{index_name}'.")
+            pc.delete_index(index_name)
+        _create_pinecone_index(pc, index_name, embedding_model)
+    else:
+        needs_ingestion = False
+        if verbose:
+            print(f"Using existing index '{index_name}'. Use --force_refresh to update information.")
+
+    return PineconeVectorStore(index=pc.Index(index_name), embedding=embedding_model), needs_ingestion
+
+
+def _open_pinecone_namespace(shared_index: str, namespace: str, embedding_model, force_refresh: bool,
+                             verbose: bool = False):
+    from pinecone import Pinecone
+    from langchain_pinecone import PineconeVectorStore
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    if shared_index not in [index_info["name"] for index_info in pc.list_indexes()]:
+        # Only the first startup pays for provisioning the shared index
+        _create_pinecone_index(pc, shared_index, embedding_model)
+    index = pc.Index(shared_index)
+
+    namespaces = index.describe_index_stats().get("namespaces") or {}
+    needs_ingestion = True
+    if namespace in namespaces and force_refresh:
+        if verbose:
+            print(f"Force refresh requested. Deleting namespace '{namespace}' of index '{shared_index}'.")
+        index.delete(delete_all=True, namespace=namespace)
+    elif namespace in namespaces:
+        needs_ingestion = False
+        if verbose:
+            print(f"Using existing namespace '{namespace}' of index '{shared_index}'. "
+                  f"Use --force_refresh to update information.")
+
+    return PineconeVectorStore(index=index, embedding=embedding_model, namespace=namespace), needs_ingestion
+
+
+def _open_local(index_name: str, embedding_model, cache_dir: str, force_refresh: bool, verbose: bool = False):
+    path = os.path.join(cache_dir, "vectors", index_name)
+    needs_ingestion = True
+    if LocalVectorStore.exists(path) and not force_refresh:
+        needs_ingestion = False
+        if verbose:
+            print(f"Using existing local index '{path}'. Use --force_refresh to update information.")
+    elif os.path.exists(path):
+        if verbose:
+            print(f"Force refresh requested. Deleting existing local index '{path}'.")
+        shutil.rmtree(path)
+    return LocalVectorStore(path, embedding_model), needs_ingestion
+
+
+def open_vector_store(backend: str, index_name: str, embedding_model, cache_dir: str = DEFAULT_CACHE_DIR,
+                      force_refresh: bool = False, verbose: bool = False,
+                      shared_index: Optional[str] = None) -> Tuple[VectorStore, bool]:
+    """
+    Open the vector store of `index_name` on the given backend ("pinecone" or "local").
+    A new store is created when it does not exist yet or when `force_refresh` is set, in
+    which case the second value returned is True: the store has to be filled.
+
+    With `shared_index`, Pinecone stores every startup as the `index_name` namespace of that
+    one index instead of creating an index per startup.
+    """
+    if backend == "local":
+        return _open_local(index_name, embedding_model, cache_dir, force_refresh, verbose)
+    if backend == "pinecone" and shared_index:
+        return _open_pinecone_namespace(shared_index, index_name, embedding_model, force_refresh, verbose)
+    if backend == "pinecone":
+        return _open_pinecone(index_name, embedding_model, force_refresh, verbose)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def delete_chunks(vector_store: VectorStore, ids: List[str], batch_size: int = 1000):
+    # Pinecone deletes at most 1000 ids per request
+    for i in range(0, len(ids), batch_size):
+        vector_store.delete(ids=ids[i:i + batch_size])
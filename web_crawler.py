@@ -1,11 +1,12 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from urllib.parse import quote
 
 import os
-import io
+import re
+import html
+import threading
 
-from trafilatura import extract
-from selenium.common.exceptions import TimeoutException
 from langchain_core.documents.base import Document
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -14,11 +15,28 @@ from langsmith import traceable
 from langchain.prompts import load_prompt
 from langchain.chat_models.base import BaseChatModel
 from langchain_core.messages import SystemMessage, HumanMessage
-import requests
-import pdfplumber
+import httpx
 
+import fetch_engine as fe
+from cache import get_page_cache, get_search_cache
+from extraction import extract_html, extract_pdf
+
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+
+def clean_snippet(description: str) -> str:
+    """
+    Strip the markup (e.g. <strong> highlights) and entities from a search result description.
+    """
+    return _SPACE_RE.sub(' ', html.unescape(_TAG_RE.sub('', description or ''))).strip()
+
+def get_sources(query, max_pages=10, domain=None):
+    search_cache = get_search_cache()
+    cached_results = search_cache.get(query, max_pages, domain)
+    if cached_results is not None:
+        return cached_results
 
-def get_sources(query, max_pages=10, domain=None):      
     search_query = query
     if domain:
         search_query += f" site:{domain}"
@@ -26,15 +44,16 @@ def get_sources(query, max_pages=10, domain=None):
     url = f"https://api.search.brave.com/res/v1/web/search?q={quote(search_query)}&count={max_pages}"
     headers = {
         'Accept': 'application/json',
-        'Accept-Encoding': 'gzip',
         'X-Subscription-Token': os.getenv("BRAVE_SEARCH_API_KEY")
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = fe.get_engine().fetch(url, headers=headers, timeout=30, sniff=False)
 
         if response.status_code != 200:
-            return []
+            # Rate limits and server errors are failures, not empty results: they must not be
+            # cached, checkpointed or taken as sources that vanished
+            raise Exception(f'Search API returned status {response.status_code}')
 
         json_response = response.json()
 
@@ -45,10 +64,11 @@ def get_sources(query, max_pages=10, domain=None):
         final_results = [{
             'title': result['title'],
             'link': result['url'],
-            'snippet': extract(result['description'], output_format='txt', include_tables=False, include_images=False, include_formatting=True),
+            'snippet': clean_snippet(result['description']),
             'favicon': result.get('profile', {}).get('img', '')
         } for result in json_response['web']['results']]
 
+        search_cache.put(query, max_pages, domain, final_results)
         return final_results
 
     except Exception as error:
@@ -63,77 +83,248 @@ def fetch_with_firecrawl(url):
         print(f"Error fetching with FireCrawl for {url}: {e}")
         return None
 
-def fetch_with_selenium(url, get_selenium_driver, timeout=8):
-    driver = get_selenium_driver()
-    if not driver:
-        return None
+class DriverPool:
+    """
+    A bounded pool of Selenium WebDrivers shared by every browser fetch.
+
+    Browsers are started lazily with `create_driver` (up to `size` of them), handed out
+    one page at a time, reset between pages, and recycled after `max_pages` pages or
+    after any error. Call `close()` to quit every browser the pool started.
+    """
+
+    def __init__(self, create_driver, size: int = 2, max_pages: int = 20):
+        self.create_driver = create_driver
+        self.size = size
+        self.max_pages = max_pages
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # (driver, pages_served) pairs ready to be handed out
+        self._drivers = set()
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        """
+        Lease a driver for a single page. The driver goes back to the pool when the
+        block exits cleanly and is quit if the block raised (other than a page timeout).
+        """
+        # Selenium is only imported once a page needs a browser
+        from selenium.common.exceptions import TimeoutException
+
+        self._slots.acquire()
+        try:
+            driver, pages = self._checkout()
+            healthy = False
+            try:
+                yield driver
+                healthy = True
+            except TimeoutException:
+                # A slow page is not a broken browser, keep it if it can still be reset
+                healthy = True
+                raise
+            finally:
+                self._checkin(driver, pages + 1, healthy)
+        finally:
+            self._slots.release()
+
+    def _checkout(self):
+        from selenium.common.exceptions import WebDriverException
+
+        with self._lock:
+            if self._closed:
+                raise WebDriverException("Driver pool is closed")
+            if self._idle:
+                return self._idle.pop()
+        driver = self.create_driver()
+        if driver is None:
+            raise WebDriverException("Could not start a browser")
+        with self._lock:
+            self._drivers.add(driver)
+        return driver, 0
+
+    def _checkin(self, driver, pages, healthy):
+        if healthy and pages < self.max_pages and not self._closed and self._reset(driver):
+            with self._lock:
+                if not self._closed:
+                    self._idle.append((driver, pages))
+                    return
+        self._quit(driver)
+
+    @staticmethod
+    def _reset(driver) -> bool:
+        """Clear cookies, storage and extra windows so the next page starts clean."""
+        try:
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass  # Storage is not accessible on some pages (e.g. about:blank, file://)
+            driver.delete_all_cookies()
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        with self._lock:
+            self._drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """Quit every browser started by the pool. Safe to call more than once."""
+        with self._lock:
+            self._closed = True
+            drivers = list(self._drivers)
+            self._idle.clear()
+        for driver in drivers:
+            self._quit(driver)
+
+
+def fetch_with_selenium(url, driver_pool, timeout=8):
+    from selenium.common.exceptions import TimeoutException
+
     try:
-        driver.set_page_load_timeout(timeout)
-        driver.get(url)
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        return driver.page_source
+        with driver_pool.driver() as driver:
+            driver.set_page_load_timeout(timeout)
+            driver.get(url)
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            return driver.page_source
     except TimeoutException:
         print(f"Page load timed out after {timeout} seconds for {url}.")
         return None
     except Exception as e:
         print(f"Error fetching with Selenium for {url}: {e}")
         return None
-    finally:
-        driver.quit()
 
 def fetch_with_timeout(url, timeout=8):
     try:
-        response = requests.get(url, timeout=timeout)
-        response.raise_for_status()
-        return response
-    except requests.RequestException:
+        response = fe.get_engine().fetch(url, timeout=timeout)
+    except httpx.HTTPError:
         return None
+    return response if response.status_code < 400 else None
+
+def fetch_sources(sources, timeout=2, budget: fe.DownloadBudget = None) -> list:
+    """
+    Fetch every source concurrently, answering from the page cache where possible.
+    Returns one (response, cached_page) pair per source: fresh cache hits are not fetched,
+    stale entries are revalidated with their ETag/Last-Modified validators. Downloads count
+    against the `budget` of the run (the engine budget by default).
+    """
+    page_cache = get_page_cache()
+    cached_pages = [page_cache.get(source['link']) for source in sources]
+    stale = [i for i, cached in enumerate(cached_pages) if cached is None or not cached.fresh]
+    responses = fe.get_engine().fetch_many(
+        [sources[i]['link'] for i in stale], timeout=timeout,
+        headers=[cached_pages[i].validators() if cached_pages[i] else None for i in stale], budget=budget)
+
+    fetched = [(None, cached) for cached in cached_pages]
+    for i, response in zip(stale, responses):
+        cached = cached_pages[i]
+        if response is not None and response.status_code == 304 and cached is not None:
+            page_cache.refresh(cached, response.headers)
+        elif response is None or response.status_code >= 400:
+            response, cached = None, None
+        else:
+            cached = None
+        fetched[i] = (response, cached)
+    return fetched
+
+def process_response(source, response, cached=None):
+    url = source['link']
+    if cached is not None:
+        # Fresh or revalidated cache entry, no download or extraction needed
+        return {**source, 'page_content': cached.text}
+    if not response:
+        return {**source, 'page_content': None}
+    if response.skipped:
+        # Unsupported or oversized body, abandoned by the fetch engine after the first bytes
+        print(f"Skipping {url}! {response.skipped}")
+        return {**source, 'page_content': source['snippet']}
+
+    if response.kind == 'pdf':
+        # The response is a PDF file, streamed to a temporary file by the fetch engine
+        try:
+            text = extract_pdf(response.path)
+            if text:
+                get_page_cache().put_file(url, response.path, response.headers, text)
+        except Exception as e:
+            print(f"Error extracting PDF {url}: {e}")
+            text = source['snippet']
+        finally:
+            os.remove(response.path)
+        return {**source, 'page_content': text}
+    elif response.kind == 'html':
+        # The response is an HTML file, extracted in the process pool
+        main_content = extract_html(response.content, response.encoding)
+        if main_content:
+            get_page_cache().put(url, response.content, response.headers, main_content)
+        return {**source, 'page_content': main_content}
+    else:
+        print(f"Skipping {url}! No content")
+        return {**source, 'page_content': source['snippet']}
 
 def process_source(source):
+    return process_response(source, *fetch_sources([source], timeout=2)[0])
+
+def fetch_with_browser(source, driver_pool, timeout=8):
     url = source['link']
-    response = fetch_with_timeout(url, 2)
-    if response:
-        content_type = response.headers.get('Content-Type')
-        if content_type:
-            if content_type.startswith('application/pdf'):
-                # The response is a PDF file
-                pdf_content = response.content
-                # Create a file-like object from the bytes
-                pdf_file = io.BytesIO(pdf_content)
-                # Extract text from PDF using pdfplumber
-                with pdfplumber.open(pdf_file) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        text += page.extract_text()
-                return {**source, 'page_content': text}
-            elif content_type.startswith('text/html'):
-                # The response is an HTML file
-                html = response.text
-                main_content = extract(html, output_format='txt', include_links=True)
-                return {**source, 'page_content': main_content}
-            else:
-                print(f"Skipping {url}! Unsupported content type: {content_type}")
-                return {**source, 'page_content': source['snippet']}
-        else:
-            print(f"Skipping {url}! No content type")
-            return {**source, 'page_content': source['snippet']}
-    return {**source, 'page_content': None}
+    page_cache = get_page_cache()
+    cached = page_cache.get(url, kind='browser')
+    if cached is not None and cached.fresh:
+        return cached.text
+
+    print(f"Fetching with browser {url}")
+    page_html = fetch_with_selenium(url, driver_pool, timeout=timeout)
+    if not page_html:
+        return None
+    main_content = extract_html(page_html, output_format='markdown')
+    if main_content:
+        page_cache.put(url, page_html.encode('utf-8'), {}, main_content, kind='browser')
+    return main_content
 
 #@traceable(run_type="tool", name="get_links_contents")
-def get_links_contents(sources, get_driver_func=None, use_browser=False) -> list:
+def get_links_contents(sources, driver_pool=None, use_browser=False, browser_workers=None, browser_deadline=30,
+                       fetch_timeout=2, budget: fe.DownloadBudget = None) -> list:
+    """
+    Fetch and extract the content of every source. All pages are fetched concurrently through
+    the shared fetch engine, then extracted; pages already in the page cache are neither
+    downloaded nor extracted again. Sources that could not be fetched directly
+    are retried with the browser pool, at most `browser_workers` at a time (defaults to the pool
+    size). Browser fetches still running after `browser_deadline` seconds are abandoned and
+    fall back to the search snippet. Downloads count against the `budget` of the run.
+    """
+    fetched = fetch_sources(sources, timeout=fetch_timeout, budget=budget)
+    responses = [response for response, _ in fetched]
+    cached_pages = [cached for _, cached in fetched]
     with ThreadPoolExecutor() as executor:
-        results = list(executor.map(process_source, sources))
+        results = list(executor.map(process_response, sources, responses, cached_pages))
 
-    if get_driver_func is None or not use_browser:
+    if driver_pool is None or not use_browser:
         return [result for result in results if result is not None and result['page_content']]
 
-    for result in results:
-        if result['page_content'] is None:
-            url = result['link']
-            print(f"Fetching with browser {url}")
-            driver = get_driver_func()
-            html = fetch_with_selenium(url, get_driver_func)
-            main_content = extract(html, output_format='markdown', include_links=True)
-            if main_content:
-                result['page_content'] = main_content
-    return results
\ No newline at end of file
+    pending = [result for result in results if result['page_content'] is None]
+    if not pending:
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=browser_workers or driver_pool.size)
+    futures = {executor.submit(fetch_with_browser, result, driver_pool): result for result in pending}
+    done, not_done = wait(futures, timeout=browser_deadline)
+    # Don't wait for stragglers, they hand their driver back to the pool when they finish
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        main_content = future.result()
+        if main_content:
+            futures[future]['page_content'] = main_content
+    for future in not_done:
+        result = futures[future]
+        print(f"Browser deadline of {browser_deadline} seconds exceeded for {result['link']}, using snippet")
+        result['page_content'] = result['snippet']
+    return results